@@ -0,0 +1,84 @@
+"""
+Borrow/return throughput as the number of concurrent checkout desks grows.
+
+Every desk is a thread with its own test client, app context and database session, lending and taking back its own
+book to its own member, so the numbers show locking and commit overhead rather than application-level conflicts.
+Creates its members and books in the configured database, so point it at a scratch one:
+
+    ENV=dev python -m benchmarks.checkout --clients 1 10 25 50 --seconds 10
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import pendulum
+
+from nuruja import create_app
+from nuruja.extensions import db
+from nuruja.models import Book, User
+
+
+def make_desks(count: int) -> list[tuple[int, int]]:
+    run = pendulum.now().format("YYYYMMDDHHmmss")
+    members = [
+        User(username=f"desk-{run}-{i}"[:20], email=f"desk-{run}-{i}@bench", phone_number=f"{run}{i:04d}"[:20],
+             address="bench")
+        for i in range(count)
+    ]
+    books = [
+        Book(title=f"Bench {i}", author="Bench", isbn=f"desk-{run}-{i}", date_of_publication=pendulum.now(),
+             rent_fee=0, late_penalty_fee=0, status="not-rented")
+        for i in range(count)
+    ]
+    db.session.add_all(members + books)
+    db.session.commit()
+
+    return [(member.id, book.id) for member, book in zip(members, books)]
+
+
+def run_desks(app, desks: list[tuple[int, int]], seconds: float) -> tuple[int, int]:
+    barrier = threading.Barrier(len(desks))
+    deadline = time.perf_counter() + seconds
+
+    def desk(member_and_book: tuple[int, int]) -> tuple[int, int]:
+        member_id, book_id = member_and_book
+        completed = failed = 0
+
+        with app.test_client() as client:
+            barrier.wait()
+
+            while time.perf_counter() < deadline:
+                for action in ("borrow", "return"):
+                    response = client.post(f"/members/{member_id}/{action}", json=dict(book_id=book_id))
+
+                    if response.status_code == 200:
+                        completed += 1
+                    else:
+                        failed += 1
+
+        return completed, failed
+
+    with ThreadPoolExecutor(max_workers=len(desks)) as pool:
+        results = list(pool.map(desk, desks))
+
+    return sum(completed for completed, _ in results), sum(failed for _, failed in results)
+
+
+@click.command()
+@click.option("--clients", multiple=True, type=int, default=[1, 10, 25, 50], show_default=True)
+@click.option("--seconds", default=10.0, show_default=True, help="Duration of each run.")
+def main(clients: list[int], seconds: float) -> None:
+    app = create_app()
+
+    with app.app_context():
+        click.echo(f"{'clients':>8}{'ops/s':>12}{'failed':>10}")
+
+        for count in clients:
+            desks = make_desks(count)
+            completed, failed = run_desks(app, desks, seconds)
+            click.echo(f"{count:>8}{completed / seconds:>12.1f}{failed:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Latency, throughput and SQL statements per request of every blueprint, checked against a baseline.
+
+Drives a running server (or one it starts with `--server`) endpoint by endpoint, keeping `--connections` keep-alive
+connections busy with each for `--seconds`. Statements per request are read from the server's /metrics before and
+after every endpoint, so run the server with `PROMETHEUS_MULTIPROC_DIR` set (init.sh does) when it has several
+workers. Borrows, returns and balance clears write to the database, so seed a scratch one first:
+
+    ENV=dev flask seed --books 100000 --members 20000 --until 2024-01-01
+    ENV=dev python -m benchmarks.harness --server sync --save-baseline
+    ENV=dev python -m benchmarks.harness --server sync
+
+The second run exits with status 1 when the p95 latency of a hot endpoint grew by more than `--latency-threshold`,
+or its statements per request by more than `--query-threshold`, compared with benchmarks/baseline.json. Without a
+baseline to compare with, it exits with status 1 too. The baseline belongs to the machine and data it was recorded on,
+so none is committed. Needs the `async` extra for httpx.
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import click
+from prometheus_client.parser import text_string_to_metric_families
+
+try:
+    import httpx
+except ImportError as error:
+    raise SystemExit("The server benchmarks need httpx, from the async extra: poetry install --extras async") from error
+
+from benchmarks.serving import SERVERS, start_server
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+class Step(NamedTuple):
+    endpoint: str
+    method: str
+    path: str
+    body: Optional[dict] = None
+
+
+class Scenario(NamedTuple):
+    """Steps one connection repeats in order. `hot` scenarios are the ones checked against the baseline."""
+
+    name: str
+    steps: list[Step]
+    hot: bool = True
+
+
+SCENARIOS = [
+    Scenario("books", [Step("books.get_all_books", "GET", "/books?limit=50")]),
+    Scenario("books-available", [Step("books.get_available_books", "GET", "/books/available?limit=50")]),
+    Scenario("books-unavailable", [Step("books.get_unavailable_books", "GET", "/books/unavailable")], hot=False),
+    Scenario("book", [Step("books.get_single_book", "GET", "/books/{book_id}")]),
+    Scenario("members", [Step("members.get_all_members", "GET", "/members?limit=50")]),
+    Scenario("member", [Step("members.get_single_member", "GET", "/members/{member_id}")]),
+    Scenario("checkout", [
+        Step("transactions.initiate_borrow", "POST", "/members/{member_id}/borrow", {"book_id": "{book_id}"}),
+        Step("transactions.initiate_book_return", "POST", "/members/{member_id}/return", {"book_id": "{book_id}"}),
+    ]),
+    Scenario("balances", [Step("balances.get_all_user_balances", "GET", "/balances/all")]),
+    Scenario("balance-clear", [Step("balances.clear_user_balances", "GET", "/balances/{member_id}/clear")], hot=False),
+    Scenario("search", [Step("search.search_for_book", "POST", "/filter", {"parameters": "history", "limit": 20})]),
+    Scenario("pending-returns", [Step("analytics.get_pending_returns", "GET", "/analytics/pending-returns")]),
+    Scenario("book-status", [Step("analytics.get_book_statuses", "GET", "/analytics/book-status")]),
+    Scenario("balances-series", [
+        Step("analytics.get_balance_time_series", "GET", "/analytics/balances-series?granularity=week"),
+    ]),
+]
+
+
+class Slot(NamedTuple):
+    """The member and the available book one connection borrows and returns, so connections never contend"""
+
+    member_id: int
+    book_id: int
+
+
+def fill(value, slot: Slot):
+    """Fills the slot's ids into a path or body; a lone placeholder becomes the id itself rather than a string"""
+    if isinstance(value, str):
+        return getattr(slot, value[1:-1]) if value[1:-1] in slot._fields else value.format(**slot._asdict())
+
+    if isinstance(value, dict):
+        return {key: fill(item, slot) for key, item in value.items()}
+
+    return value
+
+
+def sql_statements(client: httpx.Client) -> dict[tuple[str, str], tuple[float, float]]:
+    """(method, endpoint) -> (statements, requests) so far, from the server's /metrics"""
+    totals = {}
+
+    for family in text_string_to_metric_families(client.get("/metrics").text):
+        if family.name != "nuruja_request_sql_statements":
+            continue
+
+        for sample in family.samples:
+            key = (sample.labels["method"], sample.labels["endpoint"])
+            statements, requests = totals.get(key, (0.0, 0.0))
+
+            if sample.name.endswith("_sum"):
+                totals[key] = (statements + sample.value, requests)
+            elif sample.name.endswith("_count"):
+                totals[key] = (statements, requests + sample.value)
+
+    return totals
+
+
+def make_slots(client: httpx.Client, connections: int) -> list[Slot]:
+    """Pairs available books with members whose balance is cleared, so every borrow is accepted"""
+    books = client.get("/books/available", params={"limit": connections}).json().get("books", [])
+    members = client.get("/members", params={"limit": connections}).json().get("members", [])
+
+    if len(books) < connections or len(members) < connections:
+        raise click.ClickException(f"Needs {connections} members and available books; seed the database first")
+
+    for member in members:
+        client.get(f"/balances/{member['id']}/clear")
+
+    return [Slot(member["id"], book["id"]) for member, book in zip(members, books)]
+
+
+async def load(base_url: str, scenario: Scenario, slots: list[Slot], seconds: float) -> dict[str, dict]:
+    timings = {step.endpoint: dict(latencies=[], errors=0) for step in scenario.steps}
+    limits = httpx.Limits(max_connections=len(slots), max_keepalive_connections=len(slots))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def connection(slot: Slot) -> None:
+            while time.perf_counter() < deadline:
+                for step in scenario.steps:
+                    started = time.perf_counter()
+                    response = await client.request(step.method, fill(step.path, slot), json=fill(step.body, slot))
+                    timings[step.endpoint]["latencies"].append(time.perf_counter() - started)
+
+                    # Not Found is an answer here (a search without matches), anything else is a failure
+                    if response.status_code >= 400 and response.status_code != 404:
+                        timings[step.endpoint]["errors"] += 1
+
+        await asyncio.gather(*(connection(slot) for slot in slots))
+
+    return timings
+
+
+def summarize(latencies: list[float], errors: int, seconds: float, queries: Optional[float]) -> dict:
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+    return dict(
+        requests=len(latencies),
+        errors=errors,
+        throughput=round(len(latencies) / seconds, 1),
+        p50_ms=round(percentiles[49] * 1000, 2),
+        p95_ms=round(percentiles[94] * 1000, 2),
+        p99_ms=round(percentiles[98] * 1000, 2),
+        queries_per_request=None if queries is None else round(queries, 2),
+    )
+
+
+def regressions(results: dict, baseline: dict, latency_threshold: float, query_threshold: float) -> list[str]:
+    found = []
+
+    for endpoint, result in results.items():
+        before = baseline.get(endpoint)
+
+        if not result["hot"] or before is None:
+            continue
+
+        if result["p95_ms"] > before["p95_ms"] * (1 + latency_threshold):
+            found.append(f"{endpoint}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+
+        if None not in (result["queries_per_request"], before["queries_per_request"]) and \
+                result["queries_per_request"] > before["queries_per_request"] + query_threshold:
+            found.append(f"{endpoint}: {before['queries_per_request']} -> {result['queries_per_request']} "
+                         f"statements per request")
+
+    return found
+
+
+@click.command()
+@click.option("--url", default="http://127.0.0.1:8000", show_default=True, help="Server to drive.")
+@click.option("--server", type=click.Choice(list(SERVERS)), default=None,
+              help="Start a server of this mode on --port instead of using --url.")
+@click.option("--workers", default=4, show_default=True, help="Worker processes of a started server.")
+@click.option("--port", default=8100, show_default=True)
+@click.option("--connections", default=16, show_default=True, help="Concurrent keep-alive connections.")
+@click.option("--seconds", default=10.0, show_default=True, help="Duration of each scenario.")
+@click.option("--only", multiple=True, type=click.Choice([scenario.name for scenario in SCENARIOS]),
+              help="Run only these scenarios.")
+@click.option("--baseline", "baseline_path", type=click.Path(path_type=Path), default=BASELINE, show_default=True)
+@click.option("--save-baseline", is_flag=True, help="Write the results to --baseline instead of comparing.")
+@click.option("--output", type=click.Path(path_type=Path), default=None, help="Also write the results here.")
+@click.option("--latency-threshold", default=0.25, show_default=True, help="Allowed relative growth of p95.")
+@click.option("--query-threshold", default=0.0, show_default=True, help="Allowed growth of statements per request.")
+def main(url: str, server: Optional[str], workers: int, port: int, connections: int, seconds: float,
+         only: tuple[str, ...], baseline_path: Path, save_baseline: bool, output: Optional[Path],
+         latency_threshold: float, query_threshold: float) -> None:
+    process = start_server(server, workers, port) if server else None
+    base_url = f"http://127.0.0.1:{port}" if server else url
+    results = {}
+
+    try:
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            slots = make_slots(client, connections)
+            click.echo(f"{'endpoint':<40}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}"
+                       f"{'errors':>8}")
+
+            for scenario in SCENARIOS:
+                if only and scenario.name not in only:
+                    continue
+
+                before = sql_statements(client)
+                timings = asyncio.run(load(base_url, scenario, slots, seconds))
+                after = sql_statements(client)
+
+                for step in scenario.steps:
+                    key = (step.method, step.endpoint)
+                    statements = after.get(key, (0.0, 0.0))[0] - before.get(key, (0.0, 0.0))[0]
+                    requests = after.get(key, (0.0, 0.0))[1] - before.get(key, (0.0, 0.0))[1]
+                    result = summarize(timings[step.endpoint]["latencies"], timings[step.endpoint]["errors"],
+                                       seconds, statements / requests if requests else None)
+                    results[step.endpoint] = dict(result, hot=scenario.hot)
+                    click.echo(
+                        f"{step.endpoint:<40}{result['throughput']:>10.1f}{result['p50_ms']:>10.1f}"
+                        f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                        f"{result['queries_per_request'] if requests else '-':>9}{result['errors']:>8}"
+                    )
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = json.dumps(dict(connections=connections, seconds=seconds, endpoints=results), indent=2)
+
+    if output:
+        output.write_text(report)
+
+    if save_baseline:
+        baseline_path.write_text(report)
+        click.echo(f"Baseline written to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        # Nothing to compare with is a failed check, not a passed one
+        raise click.ClickException(f"No baseline at {baseline_path}; record one with --save-baseline first")
+
+    found = regressions(results, json.loads(baseline_path.read_text())["endpoints"], latency_threshold,
+                        query_threshold)
+
+    for regression in found:
+        click.echo(f"REGRESSION {regression}", err=True)
+
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
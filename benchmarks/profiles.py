@@ -0,0 +1,58 @@
+"""
+Throughput of the gunicorn server profiles (WEB_PROFILE, see gunicorn.conf.py) on endpoints that spend most of a
+request waiting for the database.
+
+Starts gunicorn with each profile in turn, the same number of workers and each profile's own pool size, then keeps
+`--connections` keep-alive connections busy for `--seconds`. Needs the `async` extra for the client, the `gevent`
+extra for the gevent profile, and some rented books, e.g. after `flask seed`:
+
+    ENV=dev python -m benchmarks.profiles --connections 200 --workers 4 --threads 8 --seconds 20
+"""
+import asyncio
+import os
+import statistics
+
+import click
+
+from benchmarks.serving import load, start_server
+from configs import ENVIRONMENTS
+
+PROFILES = ["sync", "gthread", "gevent"]
+
+PATHS = ["/books/unavailable", "/books/available?limit=500", "/members?limit=500", "/balances/all"]
+
+
+@click.command()
+@click.option("--profiles", multiple=True, type=click.Choice(PROFILES), default=PROFILES, show_default=True)
+@click.option("--connections", default=200, show_default=True, help="Concurrent keep-alive connections.")
+@click.option("--workers", default=4, show_default=True, help="Worker processes of every profile.")
+@click.option("--threads", default=8, show_default=True, help="Threads of a gthread worker.")
+@click.option("--greenlets", default=200, show_default=True, help="Concurrent requests of a gevent worker.")
+@click.option("--seconds", default=20.0, show_default=True, help="Duration of each run.")
+@click.option("--port", default=8100, show_default=True)
+def main(profiles: list[str], connections: int, workers: int, threads: int, greenlets: int, seconds: float,
+         port: int) -> None:
+    prefix = ENVIRONMENTS[os.environ.get("ENV", "dev").lower()].__config__.env_prefix
+    click.echo(f"{'profile':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'5xx':>8}")
+
+    for profile in profiles:
+        # Through the settings rather than gunicorn's flags, so gunicorn.conf.py sizes the pools for them
+        environment = {f"{prefix}WEB_PROFILE": profile, f"{prefix}WEB_WORKERS": str(workers),
+                       f"{prefix}WEB_THREADS": str(threads), f"{prefix}WEB_CONNECTIONS": str(greenlets)}
+        server = start_server("sync", workers, port, environment)
+
+        try:
+            latencies, failures = asyncio.run(load(port, connections, seconds, PATHS))
+        finally:
+            server.terminate()
+            server.wait()
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        click.echo(
+            f"{profile:>8}{len(latencies) / seconds:>10.1f}{percentiles[49] * 1000:>10.1f}"
+            f"{percentiles[94] * 1000:>10.1f}{percentiles[98] * 1000:>10.1f}{failures:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
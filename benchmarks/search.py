@@ -0,0 +1,95 @@
+"""
+Compares POST /filter latency of the legacy `ilike '%term%'` scan with the ranked full-text/trigram search.
+
+Tops the configured database up to `--books` rows first, so point it at a scratch database:
+
+    ENV=dev python -m benchmarks.search --books 1000000 --runs 50
+"""
+import statistics
+import time
+from typing import Callable
+
+import click
+from sqlalchemy import func, or_, text
+
+from nuruja import create_app
+from nuruja.controllers.search import rank_books
+from nuruja.extensions import db
+from nuruja.models import Book
+
+WORDS = [
+    "algorithms", "introduction", "history", "mythical", "garden", "silent", "river", "empire", "machine", "learning",
+    "shadow", "kingdom", "ocean", "winter", "principles", "systems", "modern", "ancient", "journey", "theory",
+    "network", "design", "poetry", "stone", "harvest", "memory", "crystal", "forest", "language", "compilers",
+]
+
+TERMS = ["algorithms", "mythical machine", "compil", "ocea", "Cormen", "9780262046305"]
+
+
+def legacy_search(term: str, limit: int) -> list[Book]:
+    return Book.query.filter(or_(Book.title.ilike(f"%{term}%"), Book.author.ilike(f"%{term}%"))).all()
+
+
+def top_up_books(target: int) -> None:
+    existing = db.session.query(func.count(Book.id)).scalar()
+
+    if existing >= target:
+        return
+
+    click.echo(f"Inserting {target - existing} books...")
+    db.session.execute(
+        text(
+            """
+            INSERT INTO book (title, author, isbn, date_of_publication, status, rent_fee, late_penalty_fee)
+                SELECT initcap(concat_ws(' ', w[1 + (g * 7) % n], w[1 + (g * 13) % n], w[1 + (g * 31) % n])),
+                       initcap(concat_ws(' ', w[1 + (g * 17) % n], w[1 + (g * 23) % n])),
+                       'bench-' || g, now() - (g % 20000) * interval '1 day', 'not-rented', 100, 25
+                    FROM generate_series(:start, :stop) AS g,
+                         (SELECT CAST(:words AS text[]) AS w, CAST(:n AS integer) AS n) AS vocabulary
+            """
+        ),
+        dict(start=existing + 1, stop=target, words=WORDS, n=len(WORDS)),
+    )
+    db.session.commit()
+    db.session.execute(text("ANALYZE book"))
+    db.session.commit()
+
+
+def measure(engine: Callable[[str, int], list], term: str, runs: int, limit: int) -> list[float]:
+    samples = []
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        engine(term, limit)
+        samples.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+
+    return samples
+
+
+def p95(samples: list[float]) -> float:
+    return statistics.quantiles(samples, n=100)[94]
+
+
+@click.command()
+@click.option("--books", default=1_000_000, show_default=True, help="Rows to have in the book table.")
+@click.option("--runs", default=50, show_default=True, help="Timed runs per search term and engine.")
+@click.option("--limit", default=50, show_default=True, help="Page size for the ranked search.")
+def main(books: int, runs: int, limit: int) -> None:
+    app = create_app()
+
+    with app.app_context():
+        top_up_books(books)
+
+        click.echo(f"{'term':<20}{'ilike p50':>12}{'ilike p95':>12}{'ranked p50':>12}{'ranked p95':>12}  (ms)")
+        for term in TERMS:
+            legacy = measure(legacy_search, term, runs, limit)
+            ranked = measure(rank_books, term, runs, limit)
+            click.echo(
+                f"{term:<20}{statistics.median(legacy):>12.2f}{p95(legacy):>12.2f}"
+                f"{statistics.median(ranked):>12.2f}{p95(ranked):>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
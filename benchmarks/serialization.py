@@ -0,0 +1,122 @@
+"""
+Cost of serializing every schema in controllers/schemas.py, the pydantic way and the fast way.
+
+For each schema a payload of `--rows` rows per list field is built from the field types. The pydantic path validates
+it into the model, calls `.dict()` and encodes with Flask's default JSON provider, as the views used to. The fast
+path builds the same dicts from row tuples with `serialize_rows` and encodes with the orjson provider. Both must give
+the same bytes. Needs no database:
+
+    python -m benchmarks.serialization --rows 1000
+"""
+import inspect
+import timeit
+from collections import namedtuple
+from datetime import date, datetime
+from typing import Type
+
+import click
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from pydantic.fields import SHAPE_SINGLETON, ModelField
+
+from nuruja.controllers import schemas
+from nuruja.controllers.schemas import BaseSchema
+from nuruja.serialization import OrjsonProvider, row_serializer
+
+SAMPLES = {int: 42, float: 150.5, str: "The Mythical Man Month", bool: False, date: date(2023, 3, 6)}
+
+
+def sample(field: ModelField, index: int):
+    if not field.required:
+        return field.default
+
+    if not inspect.isclass(field.type_):
+        return None
+
+    if issubclass(field.type_, datetime):
+        value = datetime(2023, 3, 6, 9, 30, index % 60)
+    else:
+        value = next((value if type_ is not int else index + 1 for type_, value in SAMPLES.items()
+                      if issubclass(field.type_, type_)), None)
+
+    return value if field.shape == SHAPE_SINGLETON else [value]
+
+
+def nested(field: ModelField) -> bool:
+    return inspect.isclass(field.type_) and issubclass(field.type_, BaseSchema)
+
+
+def rows_of(schema: Type[BaseSchema], count: int) -> list:
+    """Row tuples with a `_fields`, like result rows, for a schema of plain fields"""
+    Row = namedtuple(schema.__name__, list(schema.__fields__))
+    return [Row(*(sample(field, index) for field in schema.__fields__.values())) for index in range(count)]
+
+
+def payloads(schema: Type[BaseSchema], count: int) -> tuple[dict, dict]:
+    """The same content as keyword arguments for the model, and as rows for the fast path"""
+    arguments, fast = {}, {}
+
+    for name, field in schema.__fields__.items():
+        if nested(field):
+            rows = rows_of(field.type_, count)
+            single = field.shape == SHAPE_SINGLETON
+            arguments[name] = rows[0]._asdict() if single else [row._asdict() for row in rows]
+            fast[name] = rows[0] if single else rows
+        else:
+            arguments[name] = fast[name] = sample(field, 0)
+
+    return arguments, fast
+
+
+def fast_path(schema: Type[BaseSchema], fast: dict) -> dict:
+    record = {}
+
+    for name, field in schema.__fields__.items():
+        value = fast[name]
+
+        if nested(field) and isinstance(value, list):
+            serialize = row_serializer(field.type_, tuple(field.type_.__fields__))
+            record[name] = [serialize(row) for row in value]
+        elif nested(field):
+            record[name] = row_serializer(field.type_, tuple(field.type_.__fields__))(value)
+        else:
+            record[name] = value
+
+    return record
+
+
+@click.command()
+@click.option("--rows", default=1000, show_default=True, help="Rows in every list field.")
+@click.option("--repeat", default=20, show_default=True, help="Timed runs per path; the best is reported.")
+def main(rows: int, repeat: int) -> None:
+    app = Flask(__name__)
+    default, fast = DefaultJSONProvider(app), OrjsonProvider(app)
+    models = [model for _, model in inspect.getmembers(schemas, inspect.isclass)
+              if issubclass(model, BaseSchema) and model is not BaseSchema]
+
+    click.echo(f"{'schema':<32}{'pydantic us':>14}{'fast us':>12}{'speedup':>10}")
+
+    for model in models:
+        arguments, rows_payload = payloads(model, rows)
+
+        try:
+            model(**arguments)
+        except ValueError:
+            click.echo(f"{model.__name__:<32}{'(no valid sample)':>36}")
+            continue
+
+        def pydantic_path() -> bytes:
+            return default.response(model(**arguments).dict()).get_data()
+
+        def orjson_path() -> bytes:
+            return fast.response(fast_path(model, rows_payload)).get_data()
+
+        same = pydantic_path() == orjson_path()
+        slow_us = min(timeit.repeat(pydantic_path, number=1, repeat=repeat)) * 1e6
+        fast_us = min(timeit.repeat(orjson_path, number=1, repeat=repeat)) * 1e6
+        click.echo(f"{model.__name__:<32}{slow_us:>14.1f}{fast_us:>12.1f}{slow_us / fast_us:>9.1f}x"
+                   f"{'' if same else '  (output differs)'}")
+
+
+if __name__ == "__main__":
+    main()
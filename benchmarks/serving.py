@@ -0,0 +1,103 @@
+"""
+Read throughput of the sync (gunicorn + wsgi.py) and async (uvicorn + asgi.py) serving modes under many concurrent
+connections.
+
+Starts each server in turn with the same number of worker processes on the configured database, then keeps
+`--connections` keep-alive connections busy with the hot read endpoints for `--seconds`. Needs the `async` extra and
+some data to read, e.g. after `python -m benchmarks.search`:
+
+    ENV=dev python -m benchmarks.serving --connections 200 --workers 4 --seconds 20
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import click
+
+try:
+    import httpx
+except ImportError as error:
+    raise SystemExit("The server benchmarks need httpx, from the async extra: poetry install --extras async") from error
+
+PATHS = ["/books?limit=50", "/books/available?limit=50", "/books/1", "/members?limit=50", "/balances/all",
+         "/analytics/book-status"]
+
+SERVERS = {
+    "sync": ["-m", "gunicorn", "wsgi:app", "--workers", "{workers}", "--bind", "127.0.0.1:{port}"],
+    "async": ["-m", "uvicorn", "asgi:app", "--workers", "{workers}", "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def start_server(mode: str, workers: int, port: int, environment: Optional[dict] = None) -> subprocess.Popen:
+    arguments = [argument.format(workers=workers, port=port) for argument in SERVERS[mode]]
+    server = subprocess.Popen([sys.executable, *arguments], env={**os.environ, **(environment or {})})
+    deadline = time.perf_counter() + 30
+
+    while time.perf_counter() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise click.ClickException(f"The {mode} server did not start on port {port}")
+
+
+async def load(port: int, connections: int, seconds: float, paths: list[str] = PATHS) -> tuple[list[float], int]:
+    latencies, failures = [], 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def connection(offset: int) -> None:
+            nonlocal failures
+            requests = 0
+
+            while time.perf_counter() < deadline:
+                path = paths[(offset + requests) % len(paths)]
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                requests += 1
+
+                if response.status_code >= 500:
+                    failures += 1
+
+        await asyncio.gather(*(connection(offset) for offset in range(connections)))
+
+    return latencies, failures
+
+
+@click.command()
+@click.option("--modes", multiple=True, type=click.Choice(list(SERVERS)), default=list(SERVERS), show_default=True)
+@click.option("--connections", default=200, show_default=True, help="Concurrent keep-alive connections.")
+@click.option("--workers", default=4, show_default=True, help="Worker processes of either server.")
+@click.option("--seconds", default=20.0, show_default=True, help="Duration of each run.")
+@click.option("--port", default=8100, show_default=True)
+def main(modes: list[str], connections: int, workers: int, seconds: float, port: int) -> None:
+    click.echo(f"{'mode':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'5xx':>8}")
+
+    for mode in modes:
+        server = start_server(mode, workers, port)
+
+        try:
+            latencies, failures = asyncio.run(load(port, connections, seconds))
+        finally:
+            server.terminate()
+            server.wait()
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        click.echo(
+            f"{mode:>6}{len(latencies) / seconds:>10.1f}{percentiles[49] * 1000:>10.1f}"
+            f"{percentiles[94] * 1000:>10.1f}{percentiles[98] * 1000:>10.1f}{failures:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Cold start cost of the package and of a ready application, each measured in fresh interpreters.
+
+Reports the median wall time of `import nuruja` and of `import wsgi` (the application gunicorn serves), then the
+slowest top-level imports from `python -X importtime`, which is where to look when the numbers grow:
+
+    ENV=dev python -m benchmarks.startup --runs 10
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+
+STATEMENTS = {"package": "import nuruja", "application": "import wsgi"}
+
+
+def import_times(statement: str) -> dict[str, tuple[int, int]]:
+    """Self and cumulative microseconds of every module `statement` imports, from `python -X importtime`"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True,
+                            check=True)
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        own, cumulative, name = (field.strip() for field in line.removeprefix("import time:").split("|"))
+
+        if own.isdigit():
+            times[name] = (int(own), int(cumulative))
+
+    return times
+
+
+def wall_time(statement: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True)
+
+    return time.perf_counter() - started
+
+
+@click.command()
+@click.option("--runs", default=10, show_default=True, help="Fresh interpreters timed per statement.")
+@click.option("--top", default=15, show_default=True, help="Slowest top-level imports listed.")
+def main(runs: int, top: int) -> None:
+    baseline = statistics.median(wall_time("pass") for _ in range(runs))
+    click.echo(f"{'':<14}{'median ms':>12}{'over bare python':>20}")
+
+    for name, statement in STATEMENTS.items():
+        median = statistics.median(wall_time(statement) for _ in range(runs))
+        click.echo(f"{name:<14}{median * 1000:>12.1f}{(median - baseline) * 1000:>20.1f}")
+
+    times = import_times(STATEMENTS["application"])
+    top_level = {name: cumulative for name, (_, cumulative) in times.items() if "." not in name}
+    click.echo(f"\n{'module':<32}{'cumulative ms':>14}")
+
+    for name, cumulative in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top]:
+        click.echo(f"{name:<32}{cumulative / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from typing import Literal, Optional
 
 from pydantic import BaseSettings, PostgresDsn
 
@@ -8,6 +10,50 @@ class DevConfigs(BaseSettings):
 
     SECRET_KEY: str
 
+    # Keyset pagination on the list endpoints
+    PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 500
+
+    # Analytics response cache, shared by the workers on a host through this file
+    CACHE_PATH: str = os.path.join(tempfile.gettempdir(), "nuruja-cache.sqlite3")
+    CACHE_TTL: int = 30
+    CACHE_STALE_TTL: int = 300
+
+    # gunicorn server profile (gunicorn.conf.py). A sync worker serves one request at a time, a gthread worker
+    # WEB_THREADS and a gevent worker (the `gevent` extra) up to WEB_CONNECTIONS on green threads. WEB_WORKERS of 0
+    # starts (2 x CPUs) + 1 sync workers, or one per CPU for the other profiles
+    WEB_PROFILE: Literal["sync", "gthread", "gevent"] = "sync"
+    WEB_WORKERS: int = 0
+    WEB_THREADS: int = 8
+    WEB_CONNECTIONS: int = 200
+    WEB_BIND: str = "0.0.0.0:8000"
+    WEB_TIMEOUT: int = 30
+    WEB_KEEPALIVE: int = 5
+
+    # Connection pool of each worker. Under gunicorn, without a POOL_SIZE the pool holds one connection per request a
+    # worker serves at once, within its share of the DATABASE_CONNECTIONS of all the workers; elsewhere it holds 5.
+    # STATEMENT_TIMEOUT is in milliseconds, 0 for none. Set PGBOUNCER when connecting through PgBouncer in transaction
+    # pooling mode
+    POOL_SIZE: Optional[int] = None
+    DATABASE_CONNECTIONS: int = 80
+    POOL_MAX_OVERFLOW: int = 10
+    POOL_TIMEOUT: float = 30
+    POOL_RECYCLE: int = 1800
+    POOL_PRE_PING: bool = True
+    STATEMENT_TIMEOUT: int = 0
+    PGBOUNCER: bool = False
+
+    # Read replicas for GET requests, as a JSON list. One lagging more than REPLICA_MAX_LAG seconds is skipped, and
+    # clients read from the primary for REPLICA_PIN_SECONDS after a write
+    REPLICA_DSNS: list[PostgresDsn] = []
+    REPLICA_MAX_LAG: float = 5
+    REPLICA_PIN_SECONDS: int = 5
+    REPLICA_CHECK_INTERVAL: float = 10
+
+    # Connection pool of the async read endpoints (asgi.py), shared by every request of a worker
+    ASYNC_POOL_SIZE: int = 20
+    ASYNC_MAX_OVERFLOW: int = 10
+
     class Config:
         env_file = ".env"
         env_prefix = "DEV_"
@@ -24,21 +70,40 @@ class ProdConfigs(DevConfigs):
         env_prefix = "PROD_"
 
 
-def factory():
-    env: str = os.environ.get("ENV", "dev")
+ENVIRONMENTS = {"dev": DevConfigs, "test": TestConfigs, "prod": ProdConfigs}
+
+
+def factory() -> DevConfigs:
+    """Settings of the environment selected by ENV, read from the environment and .env"""
+    env: str = os.environ.get("ENV", "dev").lower()
+
+    if env not in ENVIRONMENTS:
+        raise ValueError(f"ENV must be one of {', '.join(ENVIRONMENTS)}, not {env!r}")
+
+    return ENVIRONMENTS[env]()
+
+
+class LazyConfigs(object):
+    """
+    Stands in for the selected environment's settings, which are only read on first use
+
+    Importing `configs` then costs nothing, and commands that never look at a setting never parse .env.
+    """
+
+    def __init__(self) -> None:
+        object.__setattr__(self, "_configs", None)
+
+    def _load(self) -> DevConfigs:
+        if self._configs is None:
+            object.__setattr__(self, "_configs", factory())
 
-    development: DevConfigs = DevConfigs()
-    testing: TestConfigs = TestConfigs()
-    production: ProdConfigs = ProdConfigs()
+        return self._configs
 
-    env = env.lower()
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
 
-    if env == "dev":
-        return development
-    elif env == "test":
-        return testing
-    elif env == "prod":
-        return production
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self._load(), name, value)
 
 
-configs = factory()
+configs: DevConfigs = LazyConfigs()
@@ -0,0 +1,79 @@
+"""
+gunicorn settings, from the WEB_ settings of the selected environment (see configs). WEB_PROFILE sets how each worker
+serves requests at once:
+
+* sync: one at a time, on (2 x CPUs) + 1 workers unless WEB_WORKERS is set
+* gthread: WEB_THREADS at a time on threads, which leave the GIL to the others while they wait for the database
+* gevent: up to WEB_CONNECTIONS at a time on green threads, with psycopg2 made cooperative by psycogreen (the
+  `gevent` extra)
+
+Unless POOL_SIZE is set, each worker pools as many connections as it serves requests at once, so none waits for one.
+"""
+import multiprocessing
+import os
+
+from prometheus_client import multiprocess
+
+from configs import configs
+
+CONCURRENCY = {"sync": 1, "gthread": configs.WEB_THREADS, "gevent": configs.WEB_CONNECTIONS}
+
+bind = [configs.WEB_BIND]
+worker_class = configs.WEB_PROFILE
+# A sync worker given threads would turn into a gthread one
+threads = configs.WEB_THREADS if worker_class == "gthread" else 1
+worker_connections = configs.WEB_CONNECTIONS
+timeout = configs.WEB_TIMEOUT
+keepalive = configs.WEB_KEEPALIVE
+# Behind the reverse proxy of docker-compose.yml, which sets X-Forwarded-For
+forwarded_allow_ips = "*"
+
+if configs.WEB_WORKERS:
+    workers = configs.WEB_WORKERS
+elif worker_class == "sync":
+    workers = multiprocessing.cpu_count() * 2 + 1
+else:
+    workers = multiprocessing.cpu_count()
+
+# Import the application once in the master and fork the workers from it, so they are ready sooner and share its
+# memory. Set GUNICORN_PRELOAD=false to import it in every worker instead. gevent workers always import it themselves,
+# once the standard library is patched for green threads
+preload_app = (worker_class != "gevent"
+               and os.environ.get("GUNICORN_PRELOAD", "true").lower() not in ("0", "false", "no"))
+
+
+def worker_pool_size(concurrency: int, workers: int) -> int:
+    """
+    Connections each of `workers` processes keeps pooled when it serves `concurrency` requests at once.
+
+    One per request, unless the workers together would hold more than DATABASE_CONNECTIONS; then each gets an even
+    share, and its other requests wait for a connection (up to POOL_TIMEOUT).
+    """
+    return max(1, min(concurrency, configs.DATABASE_CONNECTIONS // workers))
+
+
+if configs.POOL_SIZE is None:
+    # Set before the application, and its engines, are created in the master or the workers
+    configs.POOL_SIZE = worker_pool_size(CONCURRENCY[worker_class], workers)
+
+
+def post_fork(server, worker) -> None:
+    """Keeps a worker forked from a preloaded application off the connections it inherited from the master."""
+    if server.cfg.preload_app:
+        from nuruja.pool import dispose_inherited_pools
+
+        dispose_inherited_pools(server.app.wsgi())
+
+
+def post_worker_init(worker) -> None:
+    """Has psycopg2 wait for the database on the gevent hub, so a query only blocks the green thread running it."""
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
+
+
+def child_exit(server, worker) -> None:
+    """Stops counting the live gauges of a dead worker in /metrics; its counters and histograms are kept."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,2 +1,7 @@
 #!/bin/sh
-export ENV=dev && exec gunicorn --bind 0.0.0.0:8000 wsgi:app --forwarded-allow-ips='*'
\ No newline at end of file
+# Workers share their metrics through files in this directory; stale files from a previous run would be added in
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/nuruja-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Workers, bind address and server profile come from the WEB_ settings (gunicorn.conf.py); any arguments are passed on
+export ENV="${ENV:-dev}" && exec gunicorn --config gunicorn.conf.py wsgi:app "$@"
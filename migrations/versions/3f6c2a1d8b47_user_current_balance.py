@@ -0,0 +1,42 @@
+"""user current balance
+
+Revision ID: 3f6c2a1d8b47
+Revises: 9489b9380176
+Create Date: 2026-10-18 09:20:11.402317
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a1d8b47'
+down_revision = '9489b9380176'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_current_balance',
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('user_balance_id', sa.Integer(), nullable=False),
+                    sa.Column('balance', sa.Float(), nullable=False),
+                    sa.Column('date_of_entry', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='cascade'),
+                    sa.ForeignKeyConstraint(['user_balance_id'], ['user_balance.id'], ondelete='cascade'),
+                    sa.PrimaryKeyConstraint('user_id')
+                    )
+
+    # Backfill from the existing ledger
+    op.execute(
+        """
+        INSERT INTO user_current_balance (user_id, user_balance_id, balance, date_of_entry)
+            SELECT DISTINCT ON (user_id) user_id, id, balance, date_of_entry
+                FROM user_balance
+                WHERE user_id IS NOT NULL
+                ORDER BY user_id, date_of_entry DESC, id DESC
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('user_current_balance')
@@ -0,0 +1,25 @@
+"""transactions penalty applied
+
+Revision ID: 4c8b2f6d1e93
+Revises: a6f3d81c0e52
+Create Date: 2026-10-18 15:02:37.615904
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4c8b2f6d1e93'
+down_revision = 'a6f3d81c0e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant default, so existing rows are not rewritten
+    op.add_column('transactions',
+                  sa.Column('penalty_applied', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    op.drop_column('transactions', 'penalty_applied')
@@ -0,0 +1,41 @@
+"""updated_at columns and table versions for conditional GETs
+
+Revision ID: 5d2e9a7c4f10
+Revises: b81e4c07d2a9
+Create Date: 2026-10-18 11:02:47.508311
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5d2e9a7c4f10'
+down_revision = 'b81e4c07d2a9'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('user', 'book', 'transactions', 'user_balance')
+
+
+def upgrade():
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(
+                sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False)
+            )
+
+    op.create_table(
+        'table_version',
+        sa.Column('table_name', sa.String(length=63), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_version')
+
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,43 @@
+"""hot path indexes
+
+Revision ID: a6f3d81c0e52
+Revises: e93b5f1a6c28
+Create Date: 2026-10-18 14:07:12.448310
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a6f3d81c0e52'
+down_revision = 'e93b5f1a6c28'
+branch_labels = None
+depends_on = None
+
+# Built concurrently, outside the migration transaction, so borrows and returns keep going on large tables
+INDEXES = [
+    ('ix_book_status_id', 'book', ['status', 'id'], {}),
+    ('ix_transactions_book_history', 'transactions',
+     ['book_id', sa.text('date_borrowed DESC'), sa.text('id DESC')], {}),
+    ('ix_transactions_open_borrows', 'transactions', ['book_id', 'user_id', sa.text('date_borrowed DESC')],
+     {'postgresql_where': sa.text('NOT is_return')}),
+    ('ix_user_balance_user_entries', 'user_balance', ['user_id', sa.text('date_of_entry DESC'), sa.text('id DESC')],
+     {}),
+    ('ix_user_balance_transaction_id', 'user_balance', ['transaction_id'], {}),
+    ('ix_user_current_balance_user_balance_id', 'user_current_balance', ['user_balance_id'], {}),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, **options)
+
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f'ANALYZE {table}')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
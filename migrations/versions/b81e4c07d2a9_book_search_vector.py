@@ -0,0 +1,44 @@
+"""book search vector and trigram indexes
+
+Revision ID: b81e4c07d2a9
+Revises: 3f6c2a1d8b47
+Create Date: 2026-10-18 09:41:36.120554
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b81e4c07d2a9'
+down_revision = '3f6c2a1d8b47'
+branch_labels = None
+depends_on = None
+
+BOOK_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B')"
+)
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(BOOK_SEARCH_DOCUMENT, persisted=True),
+                      nullable=True)
+        )
+        batch_op.create_index('ix_book_search_vector', ['search_vector'], unique=False, postgresql_using='gin')
+        batch_op.create_index('ix_book_title_trgm', ['title'], unique=False, postgresql_using='gin',
+                              postgresql_ops={'title': 'gin_trgm_ops'})
+        batch_op.create_index('ix_book_author_trgm', ['author'], unique=False, postgresql_using='gin',
+                              postgresql_ops={'author': 'gin_trgm_ops'})
+
+
+def downgrade():
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_author_trgm', postgresql_using='gin')
+        batch_op.drop_index('ix_book_title_trgm', postgresql_using='gin')
+        batch_op.drop_index('ix_book_search_vector', postgresql_using='gin')
+        batch_op.drop_column('search_vector')
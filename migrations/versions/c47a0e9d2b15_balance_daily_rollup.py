@@ -0,0 +1,37 @@
+"""balance daily rollup
+
+Revision ID: c47a0e9d2b15
+Revises: 5d2e9a7c4f10
+Create Date: 2026-10-18 11:48:09.264117
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c47a0e9d2b15'
+down_revision = '5d2e9a7c4f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'balance_daily_rollup',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('entries', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+    )
+    op.execute(
+        """
+        INSERT INTO balance_daily_rollup (day, total, entries)
+            SELECT date_of_entry::date, SUM(balance), COUNT(*)
+                FROM user_balance
+                GROUP BY date_of_entry::date
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('balance_daily_rollup')
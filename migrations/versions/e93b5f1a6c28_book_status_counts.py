@@ -0,0 +1,34 @@
+"""book status counts
+
+Revision ID: e93b5f1a6c28
+Revises: c47a0e9d2b15
+Create Date: 2026-10-18 12:31:55.871402
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e93b5f1a6c28'
+down_revision = 'c47a0e9d2b15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'book_status_counts',
+        sa.Column('status', sa.String(length=15), nullable=False),
+        sa.Column('books', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('status')
+    )
+    op.execute(
+        """
+        INSERT INTO book_status_counts (status, books)
+            SELECT status, COUNT(*) FROM book GROUP BY status
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('book_status_counts')
@@ -5,25 +5,42 @@ from pydantic import PostgresDsn
 
 from configs import configs
 from .commands import (create_db, create_tables, drop_db, drop_tables,
-                       recreate_tables)
-from .controllers.balances import balances
-from .controllers.books import books
-from .controllers.members import members
-from .controllers.search import search
-from .controllers.transactions import transactions
-from .controllers.analytics import analytics
-from .extensions import cors, db, migrations
+                       import_books, import_members, rebuild_balance_rollup,
+                       reconcile_balances, reconcile_book_statuses, recreate_tables, seed,
+                       sweep_overdue)
+from .extensions import cache, cors, db, migrations, replicas
+from .instrumentation import METRICS_MIMETYPE, instrument
 from .models import User
+from .pool import engine_options
+from .serialization import OrjsonProvider
 
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE",
+    "Access-Control-Allow-Headers": "Origin, Content-Type, Authorization",
+}
 
-def create_app(database_url: PostgresDsn = configs.POSTGRES_DSN) -> Flask:
+
+def create_app(database_url: PostgresDsn | None = None) -> Flask:
     app = Flask(__name__)
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.json = OrjsonProvider(app)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url or configs.POSTGRES_DSN
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options()
     app.config["SECRET_KEY"] = configs.SECRET_KEY
+    app.config["CACHE_PATH"] = configs.CACHE_PATH
+    app.config["CACHE_TTL"] = configs.CACHE_TTL
+    app.config["CACHE_STALE_TTL"] = configs.CACHE_STALE_TTL
+    app.config["REPLICA_DSNS"] = configs.REPLICA_DSNS
+    app.config["REPLICA_MAX_LAG"] = configs.REPLICA_MAX_LAG
+    app.config["REPLICA_PIN_SECONDS"] = configs.REPLICA_PIN_SECONDS
+    app.config["REPLICA_CHECK_INTERVAL"] = configs.REPLICA_CHECK_INTERVAL
 
     register_commands(app)
     register_extensions(app)
     register_blueprints(app)
+    instrument(app)
+
+    from .controllers.streaming import NDJSON_MIMETYPE
 
     @app.route("/", methods=["GET"])
     def index() -> tuple[str, int]:
@@ -34,12 +51,9 @@ def create_app(database_url: PostgresDsn = configs.POSTGRES_DSN) -> Flask:
 
     @app.after_request
     def set_headers(response):
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE"
-        response.headers["Content-Type"] = "application/json"
-        response.headers[
-            "Access-Control-Allow-Headers"
-        ] = "Origin, Content-Type, Authorization"
+        response.headers.update(CORS_HEADERS)
+        if response.mimetype not in (NDJSON_MIMETYPE, METRICS_MIMETYPE):
+            response.headers["Content-Type"] = "application/json"
         return response
 
     return app
@@ -49,17 +63,33 @@ def register_extensions(app: Flask) -> None:
     db.init_app(app)
     cors.init_app(app)
     migrations.init_app(app, db)
+    cache.init_app(app)
+    replicas.init_app(app)
 
 
 def register_commands(app: Flask) -> None:
-    for command in [create_db, drop_db, create_tables, drop_tables, recreate_tables]:
+    for command in [create_db, drop_db, create_tables, drop_tables, recreate_tables, reconcile_balances,
+                    reconcile_book_statuses, rebuild_balance_rollup, import_books, import_members, seed,
+                    sweep_overdue]:
         app.cli.command()(command)
 
 
 def register_blueprints(app: Flask) -> None:
+    # Imported with the application rather than the package, so CLI tools and scripts importing nuruja skip them
+    from .controllers.admin import admin
+    from .controllers.analytics import analytics
+    from .controllers.balances import balances
+    from .controllers.books import books
+    from .controllers.members import members
+    from .controllers.metrics import metrics
+    from .controllers.search import search
+    from .controllers.transactions import transactions
+
     app.register_blueprint(members)
     app.register_blueprint(books)
     app.register_blueprint(transactions)
     app.register_blueprint(balances)
     app.register_blueprint(search)
     app.register_blueprint(analytics)
+    app.register_blueprint(admin)
+    app.register_blueprint(metrics)
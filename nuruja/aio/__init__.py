@@ -0,0 +1,51 @@
+"""
+Optional ASGI serving mode (see asgi.py), installed with the `async` extra.
+
+The hot read endpoints run as async views on an asyncpg pool shared by all the requests of a worker, so a worker is
+no longer blocked for the length of every Postgres round trip. Every other route, the cached analytics included, is
+served by the unchanged Flask application, mounted as WSGI underneath.
+"""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from asgiref.wsgi import WsgiToAsgi
+from pydantic import PostgresDsn
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+
+from configs import configs
+from .database import create_engine
+from .views import (AsyncView, get_all_books, get_all_members, get_all_user_balances, get_available_books,
+                    get_pool_statistics, get_single_book, get_single_member)
+from .. import create_app
+
+
+def create_asgi_app(database_url: PostgresDsn | None = None) -> Starlette:
+    database_url = database_url or configs.POSTGRES_DSN
+    flask_app = create_app(database_url)
+    engine = create_engine(database_url)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        yield
+        await engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Route("/books", AsyncView(get_all_books, "books.get_all_books", exports=True)),
+            Route("/books/available", AsyncView(get_available_books, "books.get_available_books")),
+            Route("/books/{book_id:int}", AsyncView(get_single_book, "books.get_single_book")),
+            Route("/members", AsyncView(get_all_members, "members.get_all_members", exports=True)),
+            Route("/members/{user_id:int}", AsyncView(get_single_member, "members.get_single_member")),
+            Route("/balances/all", AsyncView(get_all_user_balances, "balances.get_all_user_balances")),
+            # The analytics stay with Flask, whose response cache they are served from
+            Route("/admin/pool", get_pool_statistics),
+            Mount("/", WsgiToAsgi(flask_app)),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.flask = flask_app
+    app.state.wsgi = app.routes[-1].app
+    app.state.engine = engine
+
+    return app
@@ -0,0 +1,16 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from ..pool import engine_options
+
+
+def create_engine(database_url: str) -> AsyncEngine:
+    """
+    Async engine on asyncpg for the same database the Flask application uses.
+
+    One engine, and so one connection pool, is shared by every request a worker serves. The pool only has to cover
+    the queries in flight at any one moment, not the connections the worker holds open.
+    """
+    url = make_url(str(database_url)).set(drivername="postgresql+asyncpg")
+
+    return create_async_engine(url, **engine_options(asynchronous=True))
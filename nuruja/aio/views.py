@@ -0,0 +1,258 @@
+"""
+Async versions of the hot read endpoints.
+
+Each view answers plain GET requests itself, on the worker's shared asyncpg pool, with the same statements, schemas,
+validators and JSON encoder as its Flask counterpart. Anything else on the same path (writes, HEAD, NDJSON exports)
+is handed to the Flask application, and so are the analytics, which are served from its shared response cache.
+"""
+import time
+from datetime import datetime
+from http import HTTPStatus
+from typing import Awaitable, Callable, Optional, Type
+from urllib.parse import urlencode
+
+from pydantic import ValidationError
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header
+
+from .. import CORS_HEADERS
+from ..controllers.balances import current_balances_statement
+from ..controllers.decorators import collection_etag, is_not_modified, row_etag, table_versions_statement
+from ..controllers.pagination import encode_cursor
+from ..controllers.schemas import (BaseSchema, BookListParameters, BookResponseSchema, MemberListParameters,
+                                   MemberResponseSchema, UserBalance)
+from ..controllers.streaming import prefers_ndjson
+from ..extensions import db
+from ..instrumentation import REQUEST_SQL, SqlTally, observe
+from ..models import Book, User
+from ..pool import pool_statistics
+from ..serialization import schema_columns, serialize_rows
+
+Handler = Callable[[Request, AsyncConnection], Awaitable[Response]]
+
+
+class AsyncView:
+    """ASGI application serving GET requests with `handler` and passing anything else on to the Flask application."""
+
+    def __init__(self, handler: Handler, endpoint: str, exports: bool = False) -> None:
+        self.handler = handler
+        self.endpoint = endpoint
+        self.exports = exports
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request = Request(scope, receive)
+
+        if request.method != "GET" or (self.exports and wants_ndjson(request)):
+            await request.app.state.wsgi(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        tally = REQUEST_SQL.set(SqlTally())
+
+        async with request.app.state.engine.connect() as connection:
+            response = await self.handler(request, connection)
+
+        # Labelled with the endpoint of the Flask view it stands in for
+        observe(request.method, self.endpoint, response.status_code, time.perf_counter() - started,
+                len(response.body), REQUEST_SQL.get())
+        REQUEST_SQL.reset(tally)
+
+        await response(scope, receive, send)
+
+
+def wants_ndjson(request: Request) -> bool:
+    return prefers_ndjson(request.query_params.get("format"),
+                          parse_accept_header(request.headers.get("accept"), MIMEAccept))
+
+
+def json_response(request: Request, body: Optional[dict], status: HTTPStatus) -> Response:
+    """Serialized with the Flask application's JSON provider, so both modes answer byte for byte the same."""
+    content = None if body is None else request.app.state.flask.json.response(body).get_data()
+    response = Response(content, status_code=status, media_type="application/json")
+    response.headers.update(CORS_HEADERS)
+
+    return response
+
+
+def not_found(request: Request, details: str) -> Response:
+    return json_response(request, dict(details=details), HTTPStatus.NOT_FOUND)
+
+
+def parse_query(request: Request, schema: Type[BaseSchema]) -> BaseSchema | Response:
+    """The query string validated against `schema`, or the 400 response flask_pydantic would have given."""
+    try:
+        return schema(**request.query_params)
+    except ValidationError as error:
+        return json_response(request, dict(validation_error=dict(query_params=error.errors())),
+                             HTTPStatus.BAD_REQUEST)
+
+
+async def paginate(request: Request, connection: AsyncConnection, statement: Select, column, limit: int,
+                   after: Optional[int] = None) -> tuple[list, Optional[str]]:
+    """Keyset pagination, as in controllers.pagination, with the `next` link built from the ASGI request."""
+    if after is not None:
+        statement = statement.where(column > after)
+
+    rows = (await connection.execute(statement.order_by(column).limit(limit + 1))).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    arguments = {**request.query_params, "limit": limit, "after": encode_cursor(getattr(rows[-1], column.key))}
+
+    return rows, f"{request.url.path}?{urlencode(arguments)}"
+
+
+async def table_versions(request: Request, connection: AsyncConnection, *tables: str) -> tuple[str, Optional[datetime]]:
+    versions = await connection.execute(table_versions_statement(tables))
+
+    return collection_etag(versions, f"{request.url.path}?{request.url.query}", request.headers.get("accept", ""))
+
+
+async def row_version(connection: AsyncConnection, model, row_id: int) -> Optional[tuple[str, datetime]]:
+    updated_at = await connection.scalar(select(model.updated_at).where(model.id == row_id))
+
+    if updated_at is None:
+        return None
+
+    return row_etag(model.__tablename__, row_id, updated_at), updated_at
+
+
+async def conditional(request: Request, found: Optional[tuple[str, Optional[datetime]]],
+                      view: Callable[[], Awaitable[Response]]) -> Response:
+    """The async counterpart of controllers.decorators.conditional."""
+    if found is None:
+        return await view()
+
+    etag, last_modified = found
+
+    if is_not_modified(etag, last_modified, request.headers.get("if-none-match"),
+                       request.headers.get("if-modified-since")):
+        response = json_response(request, None, HTTPStatus.NOT_MODIFIED)
+    else:
+        response = await view()
+
+    if response.status_code in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+        response.headers["ETag"] = f'"{etag}"'
+        response.headers["Vary"] = "Accept"
+
+        if last_modified:
+            response.headers["Last-Modified"] = http_date(last_modified)
+
+    return response
+
+
+async def get_all_books(request: Request, connection: AsyncConnection) -> Response:
+    query = parse_query(request, BookListParameters)
+
+    if isinstance(query, Response):
+        return query
+
+    async def view() -> Response:
+        statement = select(*schema_columns(Book, BookResponseSchema, query.selected("id")))
+        books, next_page = await paginate(request, connection, statement, Book.__table__.c.id, query.limit,
+                                          query.after)
+
+        if books:
+            return json_response(request, dict(books=serialize_rows(BookResponseSchema, books, query.fields),
+                                               next=next_page), HTTPStatus.OK)
+
+        return not_found(request, "Book[s] not Found")
+
+    return await conditional(request, await table_versions(request, connection, "book"), view)
+
+
+async def get_available_books(request: Request, connection: AsyncConnection) -> Response:
+    query = parse_query(request, BookListParameters)
+
+    if isinstance(query, Response):
+        return query
+
+    async def view() -> Response:
+        statement = (select(*schema_columns(Book, BookResponseSchema, query.selected("id")))
+                     .where(Book.status == "not-rented"))
+        books, next_page = await paginate(request, connection, statement, Book.__table__.c.id, query.limit,
+                                          query.after)
+
+        if books:
+            return json_response(request, dict(books=serialize_rows(BookResponseSchema, books, query.fields),
+                                               next=next_page), HTTPStatus.OK)
+
+        return not_found(request, "No Books Available")
+
+    return await conditional(request, await table_versions(request, connection, "book"), view)
+
+
+async def get_single_book(request: Request, connection: AsyncConnection) -> Response:
+    book_id = request.path_params["book_id"]
+
+    async def view() -> Response:
+        book = (await connection.execute(
+            select(*schema_columns(Book, BookResponseSchema)).where(Book.id == book_id)
+        )).first()
+
+        if book:
+            return json_response(request, BookResponseSchema.from_orm(book).dict(), HTTPStatus.OK)
+
+        return not_found(request, "Book not Found")
+
+    return await conditional(request, await row_version(connection, Book, book_id), view)
+
+
+async def get_all_members(request: Request, connection: AsyncConnection) -> Response:
+    query = parse_query(request, MemberListParameters)
+
+    if isinstance(query, Response):
+        return query
+
+    async def view() -> Response:
+        statement = select(*schema_columns(User, MemberResponseSchema, query.selected("id")))
+        members, next_page = await paginate(request, connection, statement, User.__table__.c.id, query.limit,
+                                            query.after)
+
+        if members:
+            return json_response(request, dict(members=serialize_rows(MemberResponseSchema, members, query.fields),
+                                               next=next_page), HTTPStatus.OK)
+
+        return not_found(request, "No Users")
+
+    return await conditional(request, await table_versions(request, connection, "user"), view)
+
+
+async def get_single_member(request: Request, connection: AsyncConnection) -> Response:
+    user_id = request.path_params["user_id"]
+
+    async def view() -> Response:
+        user = (await connection.execute(
+            select(*schema_columns(User, MemberResponseSchema)).where(User.id == user_id)
+        )).first()
+
+        if user:
+            return json_response(request, MemberResponseSchema.from_orm(user).dict(), HTTPStatus.OK)
+
+        return not_found(request, "User not found")
+
+    return await conditional(request, await row_version(connection, User, user_id), view)
+
+
+async def get_all_user_balances(request: Request, connection: AsyncConnection) -> Response:
+    user_balances = (await connection.execute(current_balances_statement())).all()
+
+    if user_balances:
+        return json_response(request, dict(balances=serialize_rows(UserBalance, user_balances)), HTTPStatus.OK)
+
+    return not_found(request, "Not Found.")
+
+
+async def get_pool_statistics(request: Request) -> Response:
+    """Both of the worker's pools; served without a connection so as not to count itself."""
+    with request.app.state.flask.app_context():
+        engines = {"sync": db.engine, "async": request.app.state.engine.sync_engine}
+
+    return json_response(request, pool_statistics(**engines), HTTPStatus.OK)
@@ -0,0 +1,327 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Optional, TextIO, Type
+
+from pydantic import ValidationError
+from sqlalchemy import Table, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+
+from .controllers.schemas import (BaseSchema, BookImportSchema, ImportReportSchema, MemberRequestSchema,
+                                  RejectedRowSchema)
+from .extensions import db
+from .models import Book, User
+from .models.tracking import mark_written
+
+FORMATS = ("csv", "ndjson")
+
+# Rows buffered in memory before being sent to Postgres with COPY
+COPY_BATCH_SIZE = 10_000
+
+# Only the first rejections are itemised in a report, the count covers all of them
+MAX_REPORTED_ERRORS = 100
+
+# Members are inserted with multi-row INSERTs of this many rows
+INSERT_BATCH_SIZE = 1_000
+
+BOOK_COLUMNS = ["title", "author", "isbn", "date_of_publication", "status", "rent_fee", "late_penalty_fee"]
+
+# Each of these is unique on user
+MEMBER_UNIQUE_COLUMNS = ["username", "email", "phone_number"]
+
+
+def guess_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+    """Import format from a Content-Type header or a file extension, None if neither says."""
+    if content_type:
+        mimetype = content_type.split(";")[0].strip().lower()
+
+        if mimetype in ("text/csv", "application/csv"):
+            return "csv"
+        if mimetype in ("application/x-ndjson", "application/jsonlines"):
+            return "ndjson"
+
+    if filename:
+        if filename.lower().endswith(".csv"):
+            return "csv"
+        if filename.lower().endswith((".ndjson", ".jsonl")):
+            return "ndjson"
+
+    return None
+
+
+def reject(report: ImportReportSchema, line: int, reason: str) -> None:
+    report.rejected += 1
+
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(RejectedRowSchema(line=line, reason=reason))
+
+
+def read_rows(stream: TextIO, file_format: str, report: ImportReportSchema) -> Iterator[tuple[int, dict]]:
+    """Yields (line number, row) one at a time, recording unparseable lines as rejected."""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+
+        for row in reader:
+            if None in row or None in row.values():
+                reject(report, reader.line_num, "Wrong number of fields")
+                continue
+
+            # Empty cells fall back to the schema defaults
+            yield reader.line_num, {key: value for key, value in row.items() if value != ""}
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            reject(report, line_number, f"Invalid JSON: {error}")
+            continue
+
+        if not isinstance(row, dict):
+            reject(report, line_number, "Expected a JSON object")
+            continue
+
+        yield line_number, row
+
+
+def validate_rows(rows: Iterable[tuple[int, dict]], schema: Type[BaseSchema], table: Table,
+                  report: ImportReportSchema) -> Iterator[tuple[int, BaseSchema]]:
+    """
+    Validates rows against a request schema and the column lengths of `table`.
+
+    Checking lengths here means one over-long value rejects its own row instead of failing the whole load in Postgres.
+    """
+    for line, row in rows:
+        try:
+            record = schema(**row)
+        except ValidationError as error:
+            reject(report, line, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors()))
+            continue
+
+        too_long = [
+            name for name, value in record.dict().items()
+            if isinstance(value, str) and name in table.c
+            and getattr(table.c[name].type, "length", None) and len(value) > table.c[name].type.length
+        ]
+
+        if too_long:
+            reject(report, line, f"Too long: {', '.join(too_long)}")
+            continue
+
+        yield line, record
+
+
+def copy_rows(connection: Connection, table: str, columns: list[str], rows: Iterable[tuple]) -> int:
+    """
+    Sends rows to `table` with COPY ... FROM STDIN, `COPY_BATCH_SIZE` at a time.
+
+    Runs on the connection of the current transaction, so the copied rows commit or roll back with it.
+    """
+    cursor = connection.connection.cursor()
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    copied = 0
+
+    def flush() -> None:
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        buffer.seek(0)
+        buffer.truncate()
+
+    for copied, row in enumerate(rows, start=1):
+        writer.writerow(row)
+
+        if copied % COPY_BATCH_SIZE == 0:
+            flush()
+
+    if copied % COPY_BATCH_SIZE:
+        flush()
+
+    cursor.close()
+    return copied
+
+
+def import_books(stream: TextIO, file_format: str) -> ImportReportSchema:
+    """
+    Loads a CSV or NDJSON catalog into `book`, inserting new ISBNs and updating existing ones.
+
+    Valid rows are streamed into a temporary staging table with COPY, then merged with a single
+    INSERT ... ON CONFLICT (isbn). When an ISBN appears more than once in the file the last row wins. The circulation
+    `status` of books already in the catalog is left alone. Nothing is committed here; callers run this inside a
+    unit_of_work().
+    """
+    report = ImportReportSchema()
+    connection = db.session.connection()
+
+    connection.execute(
+        text(
+            """
+            CREATE TEMPORARY TABLE book_import (
+                line integer NOT NULL,
+                title text,
+                author text,
+                isbn text,
+                date_of_publication timestamp,
+                status text,
+                rent_fee integer,
+                late_penalty_fee integer
+            ) ON COMMIT DROP
+            """
+        )
+    )
+
+    records = validate_rows(read_rows(stream, file_format, report), BookImportSchema, Book.__table__, report)
+    copy_rows(
+        connection,
+        "book_import",
+        ["line", *BOOK_COLUMNS],
+        ((line, *(getattr(record, column) for column in BOOK_COLUMNS)) for line, record in records),
+    )
+
+    superseded = connection.execute(
+        text(
+            """
+            SELECT line, isbn FROM (
+                SELECT line, isbn, ROW_NUMBER() OVER (PARTITION BY isbn ORDER BY line DESC) row_nums
+                    FROM book_import
+            ) duplicates
+                WHERE row_nums > 1
+                ORDER BY line
+            """
+        )
+    )
+
+    for line, isbn in superseded:
+        reject(report, line, f"Superseded by a later row with ISBN {isbn}")
+
+    report.errors.sort(key=lambda error: error.line)
+
+    report.inserted, report.updated = connection.execute(
+        text(
+            """
+            WITH latest AS (
+                SELECT DISTINCT ON (isbn) * FROM book_import ORDER BY isbn, line DESC
+            ), merged AS (
+                INSERT INTO book (title, author, isbn, date_of_publication, status, rent_fee, late_penalty_fee)
+                    SELECT title, author, isbn, date_of_publication, status, rent_fee, late_penalty_fee FROM latest
+                ON CONFLICT (isbn) DO UPDATE
+                    SET title = EXCLUDED.title,
+                        author = EXCLUDED.author,
+                        date_of_publication = EXCLUDED.date_of_publication,
+                        rent_fee = EXCLUDED.rent_fee,
+                        late_penalty_fee = EXCLUDED.late_penalty_fee,
+                        updated_at = now()
+                RETURNING (xmax = 0) AS inserted, status
+            ), counted AS (
+                INSERT INTO book_status_counts (status, books)
+                    SELECT status, COUNT(*) FROM merged WHERE inserted GROUP BY status ORDER BY status
+                ON CONFLICT (status) DO UPDATE
+                    SET books = book_status_counts.books + EXCLUDED.books
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged
+            """
+        )
+    ).one()
+    mark_written("book", "book_status_counts")
+
+    return report
+
+
+def batched(records: Iterable, size: int) -> Iterator[list]:
+    batch = []
+
+    for record in records:
+        batch.append(record)
+
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def insert_members(connection: Connection, batch: list[tuple[int, MemberRequestSchema]],
+                   report: ImportReportSchema) -> None:
+    """
+    Inserts one batch of members, rejecting the rows that clash with existing members.
+
+    ON CONFLICT DO NOTHING skips clashing rows without aborting the batch. Whatever did not come back from RETURNING
+    is then matched against the members it clashed with, to tell which unique field was taken.
+    """
+    values = [dict(record.dict(), is_admin=bool(record.is_admin)) for _, record in batch]
+    inserted = set(
+        connection.execute(insert(User).values(values).on_conflict_do_nothing().returning(User.username)).scalars()
+    )
+    report.inserted += len(inserted)
+
+    skipped = [(line, record) for line, record in batch if record.username not in inserted]
+
+    if not skipped:
+        return
+
+    taken = {column: set() for column in MEMBER_UNIQUE_COLUMNS}
+    clashes = connection.execute(
+        select(*(User.__table__.c[column] for column in MEMBER_UNIQUE_COLUMNS)).where(
+            or_(*(User.__table__.c[column].in_([getattr(record, column) for _, record in skipped])
+                  for column in MEMBER_UNIQUE_COLUMNS))
+        )
+    )
+
+    for clash in clashes:
+        for column in MEMBER_UNIQUE_COLUMNS:
+            taken[column].add(getattr(clash, column))
+
+    for line, record in skipped:
+        fields = [column for column in MEMBER_UNIQUE_COLUMNS if getattr(record, column) in taken[column]]
+        reason = f"{', '.join(fields)} already taken" if fields else "Clashes with an existing member"
+        reject(report, line, reason)
+
+
+def unique_in_file(records: Iterable[tuple[int, MemberRequestSchema]],
+                   report: ImportReportSchema) -> Iterator[tuple[int, MemberRequestSchema]]:
+    """Rejects rows reusing a username, email or phone number from an earlier row of the same file."""
+    seen = {column: {} for column in MEMBER_UNIQUE_COLUMNS}
+
+    for line, record in records:
+        repeated = [
+            f"{column} (line {seen[column][getattr(record, column)]})"
+            for column in MEMBER_UNIQUE_COLUMNS if getattr(record, column) in seen[column]
+        ]
+
+        if repeated:
+            reject(report, line, f"Repeats {', '.join(repeated)}")
+            continue
+
+        for column in MEMBER_UNIQUE_COLUMNS:
+            seen[column][getattr(record, column)] = line
+
+        yield line, record
+
+
+def import_members(stream: TextIO, file_format: str) -> ImportReportSchema:
+    """
+    Registers members in bulk from a CSV or NDJSON file.
+
+    Rows are validated with MemberRequestSchema and inserted `INSERT_BATCH_SIZE` at a time. A row whose username,
+    email or phone number is already taken, in the database or earlier in the file, is rejected on its own and
+    reported with the field that clashed. Existing members are never updated. Nothing is committed here; callers run
+    this inside a unit_of_work().
+    """
+    report = ImportReportSchema()
+    connection = db.session.connection()
+
+    records = validate_rows(read_rows(stream, file_format, report), MemberRequestSchema, User.__table__, report)
+
+    for batch in batched(unique_in_file(records, report), INSERT_BATCH_SIZE):
+        insert_members(connection, batch, report)
+
+    mark_written("user")
+
+    report.errors.sort(key=lambda error: error.line)
+    return report
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Callable, Iterable, Optional
+
+from flask import Flask, Response, current_app, make_response, request
+
+from .routing import read_from_primary
+from .signals import tables_committed
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        body BLOB NOT NULL,
+        status INTEGER NOT NULL,
+        generation INTEGER NOT NULL,
+        created REAL NOT NULL,
+        refreshing REAL
+    );
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+"""
+
+COUNTERS = ("hits", "stale_hits", "misses", "refreshes", "invalidations")
+
+
+class ResponseCache(object):
+    """
+    Response cache shared by every worker on the host through a SQLite file.
+
+    Entries are fresh for `ttl` seconds, and until a commit writes to one of the `tables` they depend on, which bumps
+    a shared generation number. Past that, an entry is still served for up to `stale_ttl` more seconds while a single
+    worker recomputes it in the background, so a slow aggregate never holds up a request.
+    """
+
+    def __init__(self, tables: Iterable[str] = (), app: Optional[Flask] = None) -> None:
+        self.tables = frozenset(tables)
+        self.path = None
+        self.ttl = 30
+        self.stale_ttl = 300
+        self.local = threading.local()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.path = app.config.setdefault("CACHE_PATH", "nuruja-cache.sqlite3")
+        self.ttl = app.config.setdefault("CACHE_TTL", self.ttl)
+        self.stale_ttl = app.config.setdefault("CACHE_STALE_TTL", self.stale_ttl)
+
+        with self.connection() as connection:
+            connection.executescript(SCHEMA)
+
+        tables_committed.connect(self.on_tables_committed, weak=False)
+
+    def connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process; gunicorn workers must not share the master's after a fork
+        key = (os.getpid(), self.path)
+
+        if getattr(self.local, "key", None) != key:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self.local.connection, self.local.key = connection, key
+
+        return self.local.connection
+
+    def count(self, name: str) -> None:
+        self.connection().execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def generation(self) -> int:
+        row = self.connection().execute("SELECT value FROM counters WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self) -> None:
+        """Marks every entry stale, in every worker."""
+        self.count("generation")
+        self.count("invalidations")
+
+    def on_tables_committed(self, sender, tables: frozenset) -> None:
+        if tables & self.tables:
+            self.invalidate()
+
+    def clear(self) -> None:
+        with self.connection() as connection:
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM counters")
+
+    def stats(self) -> dict:
+        values = dict(self.connection().execute("SELECT name, value FROM counters").fetchall())
+        return {name: values.get(name, 0) for name in COUNTERS}
+
+    def store(self, key: str, response: Response, generation: int) -> None:
+        self.connection().execute(
+            "INSERT OR REPLACE INTO entries (key, body, status, generation, created, refreshing) "
+            "VALUES (?, ?, ?, ?, ?, NULL)",
+            (key, response.get_data(), response.status_code, generation, time.time()),
+        )
+
+    def claim_refresh(self, key: str) -> bool:
+        """Only one worker gets to recompute a stale entry; a claim older than a minute is considered abandoned."""
+        now = time.time()
+        claimed = self.connection().execute(
+            "UPDATE entries SET refreshing = ? WHERE key = ? AND (refreshing IS NULL OR refreshing < ?)",
+            (now, key, now - 60),
+        )
+        return claimed.rowcount == 1
+
+    def compute(self, view: Callable, key: str, *args, **kwargs) -> Response:
+        # From the primary: a lagging replica's answer would be stored under the new generation and served to every
+        # client until it expires
+        read_from_primary()
+        generation = self.generation()
+        response = make_response(view(*args, **kwargs))
+
+        if response.status_code < 500:
+            self.store(key, response, generation)
+
+        return response
+
+    def refresh_in_background(self, view: Callable, key: str, path: str, *args, **kwargs) -> None:
+        app = current_app._get_current_object()
+
+        def refresh() -> None:
+            with app.test_request_context(path):
+                try:
+                    self.compute(view, key, *args, **kwargs)
+                    self.count("refreshes")
+                except Exception:
+                    app.logger.exception("Refreshing cached response %s failed", key)
+                    self.connection().execute("UPDATE entries SET refreshing = NULL WHERE key = ?", (key,))
+
+        threading.Thread(target=refresh, name=f"cache-refresh {key}", daemon=True).start()
+
+    def cached(self, view: Callable) -> Callable:
+        """Serves the view from the cache, keyed on its path and query string."""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Response:
+            key = request.full_path
+            entry = self.connection().execute(
+                "SELECT body, status, generation, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if entry:
+                body, status, generation, created = entry
+                age = time.time() - created
+
+                if generation == self.generation() and age < self.ttl:
+                    self.count("hits")
+                    return Response(body, status=status, mimetype="application/json", headers={"X-Cache": "HIT"})
+
+                if age < self.ttl + self.stale_ttl:
+                    self.count("stale_hits")
+
+                    if self.claim_refresh(key):
+                        self.refresh_in_background(view, key, request.full_path, *args, **kwargs)
+
+                    return Response(body, status=status, mimetype="application/json", headers={"X-Cache": "STALE"})
+
+            self.count("misses")
+            response = self.compute(view, key, *args, **kwargs)
+            response.headers["X-Cache"] = "MISS"
+
+            return response
+
+        return wrapper
@@ -1,26 +1,42 @@
+import functools
+import time
+from datetime import datetime
+
 import click
+import pendulum
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
-from sqlalchemy_utils import create_database, database_exists, drop_database
 
 from configs import configs
 from .extensions import db
+from .models.mixins import unit_of_work
+from .models.tracking import mark_written
+from .pool import engine_options
+
+# The formats nuruja.bulk reads; the module itself is only imported by the import commands
+FORMATS = ("csv", "ndjson")
 
 
+@functools.lru_cache(maxsize=None)
 def database_engine(uri: str) -> Engine:
-    engine = create_engine(uri)
-    return engine
+    """One engine, and pool, per database for the life of the process instead of a new one on every call."""
+    return create_engine(uri, **engine_options())
+
 
+def create_db(uri: str | None = None) -> None:
+    # Only needed by these two commands, and slow to import
+    from sqlalchemy_utils import create_database, database_exists
 
-def create_db(uri: str = configs.POSTGRES_DSN) -> None:
-    engine = database_engine(uri)
+    engine = database_engine(uri or configs.POSTGRES_DSN)
 
     if not database_exists(engine.url):
         create_database(engine.url)
 
 
 def drop_db() -> None:
+    from sqlalchemy_utils import database_exists, drop_database
+
     if click.confirm("Are you sure?", default=False, abort=True):
         engine = database_engine(uri=configs.POSTGRES_DSN)
         if database_exists(engine.url):
@@ -42,3 +58,170 @@ def recreate_tables() -> None:
     """Same as running drop_tables() and create_tables()."""
     drop_tables()
     create_tables()
+
+
+def reconcile_balances() -> None:
+    """Rebuilds user_current_balance from the latest user_balance entry of every user."""
+    # In the order writers take them: entries added meanwhile would move a balance past the one rebuilt here
+    db.session.execute(text("LOCK TABLE user_balance IN SHARE MODE"))
+    db.session.execute(text("LOCK TABLE user_current_balance IN EXCLUSIVE MODE"))
+    upserted = db.session.execute(
+        text(
+            """
+            INSERT INTO user_current_balance (user_id, user_balance_id, balance, date_of_entry)
+                SELECT DISTINCT ON (user_id) user_id, id, balance, date_of_entry
+                    FROM user_balance
+                    WHERE user_id IS NOT NULL
+                    ORDER BY user_id, date_of_entry DESC, id DESC
+            ON CONFLICT (user_id) DO UPDATE
+                SET user_balance_id = EXCLUDED.user_balance_id,
+                    balance = EXCLUDED.balance,
+                    date_of_entry = EXCLUDED.date_of_entry
+                WHERE (user_current_balance.user_balance_id, user_current_balance.balance,
+                       user_current_balance.date_of_entry)
+                    IS DISTINCT FROM (EXCLUDED.user_balance_id, EXCLUDED.balance, EXCLUDED.date_of_entry)
+            """
+        )
+    ).rowcount
+    removed = db.session.execute(
+        text(
+            """
+            DELETE FROM user_current_balance c
+                WHERE NOT EXISTS (SELECT 1 FROM user_balance b WHERE b.user_id = c.user_id)
+            """
+        )
+    ).rowcount
+    mark_written("user_current_balance")
+    db.session.commit()
+
+    click.echo(f"Current balances reconciled: {upserted} written, {removed} removed.")
+
+
+def reconcile_book_statuses() -> None:
+    """Repairs book_status_counts from the statuses currently in book."""
+    db.session.execute(text("LOCK TABLE book_status_counts IN EXCLUSIVE MODE"))
+    corrected = db.session.execute(
+        text(
+            """
+            INSERT INTO book_status_counts (status, books)
+                SELECT status, COUNT(*) FROM book GROUP BY status
+            ON CONFLICT (status) DO UPDATE
+                SET books = EXCLUDED.books
+                WHERE book_status_counts.books IS DISTINCT FROM EXCLUDED.books
+            """
+        )
+    ).rowcount
+    zeroed = db.session.execute(
+        text(
+            """
+            UPDATE book_status_counts c SET books = 0
+                WHERE books <> 0 AND NOT EXISTS (SELECT 1 FROM book b WHERE b.status = c.status)
+            """
+        )
+    ).rowcount
+    mark_written("book_status_counts")
+    db.session.commit()
+
+    click.echo(f"Book status counts reconciled: {corrected} corrected, {zeroed} zeroed.")
+
+
+def rebuild_balance_rollup() -> None:
+    """Rebuilds balance_daily_rollup from the whole user_balance ledger."""
+    db.session.execute(text("LOCK TABLE balance_daily_rollup IN EXCLUSIVE MODE"))
+    db.session.execute(text("DELETE FROM balance_daily_rollup"))
+    days = db.session.execute(
+        text(
+            """
+            INSERT INTO balance_daily_rollup (day, total, entries)
+                SELECT date_of_entry::date, SUM(balance), COUNT(*)
+                    FROM user_balance
+                    GROUP BY date_of_entry::date
+            """
+        )
+    ).rowcount
+    mark_written("balance_daily_rollup")
+    db.session.commit()
+
+    click.echo(f"Balance rollup rebuilt: {days} days.")
+
+
+@click.argument("file", type=click.File("r", encoding="utf-8", lazy=False))
+@click.option("--format", "file_format", type=click.Choice(FORMATS), default=None,
+              help="Defaults to the file extension, or csv.")
+def import_books(file, file_format: str | None) -> None:
+    """Bulk loads books from a CSV or NDJSON file ('-' for stdin), upserting on ISBN."""
+    from .bulk import guess_format, import_books as import_book_rows
+
+    file_format = file_format or guess_format(filename=file.name) or "csv"
+
+    with unit_of_work():
+        report = import_book_rows(file, file_format)
+
+    click.echo(f"Inserted: {report.inserted}, updated: {report.updated}, rejected: {report.rejected}")
+
+    for error in report.errors:
+        click.echo(f"  line {error.line}: {error.reason}", err=True)
+
+
+@click.argument("file", type=click.File("r", encoding="utf-8", lazy=False))
+@click.option("--format", "file_format", type=click.Choice(FORMATS), default=None,
+              help="Defaults to the file extension, or csv.")
+def import_members(file, file_format: str | None) -> None:
+    """Registers members in bulk from a CSV or NDJSON file ('-' for stdin)."""
+    from .bulk import guess_format, import_members as import_member_rows
+
+    file_format = file_format or guess_format(filename=file.name) or "csv"
+
+    with unit_of_work():
+        report = import_member_rows(file, file_format)
+
+    click.echo(f"Inserted: {report.inserted}, rejected: {report.rejected}")
+
+    for error in report.errors:
+        click.echo(f"  line {error.line}: {error.reason}", err=True)
+
+
+@click.option("--books", default=10_000, show_default=True)
+@click.option("--members", default=2_000, show_default=True)
+@click.option("--loans", default=20, show_default=True, help="Mean number of loans per member.")
+@click.option("--days", default=365, show_default=True, help="Length of the borrowing history.")
+@click.option("--until", type=click.DateTime(), default=None,
+              help="End of the history. Defaults to now; pass it to get the same rows on every run.")
+@click.option("--seed", "random_seed", default=0, show_default=True)
+@click.option("--processes", default=4, show_default=True, help="Worker processes generating and copying rows.")
+def seed(books: int, members: int, loans: int, days: int, until: datetime | None, random_seed: int,
+         processes: int) -> None:
+    """Fills the database with synthetic books, members and borrowing history for benchmarks."""
+    # Faker takes a while to import, and no other command needs it
+    from .synthetic import seed_database
+
+    # Into the database the app is bound to, where the derived tables are rebuilt below
+    uri = db.engine.url.render_as_string(hide_password=False)
+    written = seed_database(uri, books, members, loans, random_seed, days,
+                            until or datetime.now().replace(microsecond=0), processes)
+    click.echo("Seeded: {} books, {} members, {} transactions, {} balance entries.".format(*written))
+
+    # The rows were copied past the ORM listeners, so the derived tables are rebuilt from them
+    reconcile_balances()
+    rebuild_balance_rollup()
+    reconcile_book_statuses()
+    mark_written("book", "user", "transactions", "user_balance", "user_current_balance")
+    db.session.commit()
+
+
+@click.option("--batch-size", default=1000, show_default=True, help="Loans charged per transaction.")
+@click.option("--loop", is_flag=True, help="Keep sweeping every --interval seconds until stopped.")
+@click.option("--interval", default=300, show_default=True, help="Seconds between sweeps with --loop.")
+def sweep_overdue(batch_size: int, loop: bool, interval: int) -> None:
+    """Charges the late fee of every open loan past its due date, once."""
+    from .overdue import charge_overdue_loans
+
+    while True:
+        report = charge_overdue_loans(pendulum.now().naive(), batch_size)
+        click.echo(f"Overdue loans charged: {report.loans} loans, {report.members} members, {report.fees} in fees.")
+
+        if not loop:
+            return
+
+        db.session.remove()
+        time.sleep(interval)
@@ -0,0 +1,13 @@
+from http import HTTPStatus
+
+from flask import Blueprint
+
+from ..extensions import db, replicas
+from ..pool import pool_statistics
+
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+@admin.route("/pool", methods=["GET"])
+def get_pool_statistics() -> tuple[dict, HTTPStatus]:
+    return pool_statistics(sync=db.engine, **replicas.engines), HTTPStatus.OK
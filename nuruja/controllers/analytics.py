@@ -2,43 +2,62 @@ from http import HTTPStatus
 
 from flask import Blueprint, jsonify
 from flask.wrappers import Response
-from sqlalchemy import func, text
+from flask_pydantic import validate
+from sqlalchemy import Select, cast, func, literal, select
 
-from ..extensions import db
-from ..models import Book, UserBalance
-from .schemas import (BalanceSeriesAnalyticsSchema, BookStatusAnalyticsSchema,
-                      PendingReturnsAnalyticsSchema)
+from .balances import current_balances
+from ..extensions import cache, db
+from ..models import BalanceDailyRollup, BookStatusCount
+from ..serialization import serialize_rows
+from .schemas import (BalanceSeriesAnalyticsSchema, BalanceSeriesParameters, BookStatusAnalyticsSchema,
+                      PendingReturnsAnalyticsSchema, UserBalance)
 
 analytics = Blueprint("analytics", __name__, url_prefix="/analytics")
 
 
+def book_status_statement() -> Select:
+    return select(BookStatusCount.status.label("id"), BookStatusCount.status.label("label"),
+                  BookStatusCount.books.label("value")).where(BookStatusCount.books > 0).order_by(
+        BookStatusCount.status)
+
+
+def balance_series_statement(query: BalanceSeriesParameters) -> Select:
+    # Reads the daily rollup rather than the ledger: one row per day, whatever the number of entries
+    # The granularity is inlined: as a bound parameter, the SELECT and GROUP BY expressions would not match
+    granularity = literal(query.granularity, literal_execute=True)
+    bucket = func.date_trunc(granularity, cast(BalanceDailyRollup.day, db.DateTime))
+    statement = select(bucket.label("x"), func.sum(BalanceDailyRollup.total).label("y"))
+
+    if query.from_:
+        statement = statement.where(BalanceDailyRollup.day >= query.from_)
+
+    if query.to:
+        statement = statement.where(BalanceDailyRollup.day <= query.to)
+
+    return statement.group_by(bucket).order_by(bucket)
+
+
+def pending_returns(user_balances: list) -> dict:
+    """PendingReturnsAnalyticsSchema of current balance rows, built without a model per member"""
+    return dict(username=PendingReturnsAnalyticsSchema.__fields__["username"].default,
+                children=serialize_rows(UserBalance, user_balances))
+
+
 @analytics.route("/pending-returns", methods=["GET"])
+@cache.cached
 def get_pending_returns() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    sql = text(
-        """
-            WITH cte AS (
-                SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date_of_entry DESC) row_nums
-                    FROM user_balance
-            )
-            SELECT c.id, c.user_id, u.username, c.balance, c.date_of_entry 
-                FROM cte c INNER JOIN public.user u ON c.user_id = u.id
-                    WHERE c.row_nums = 1
-        """
-    )
-
-    user_balances = db.session.execute(sql).fetchall()
+    user_balances = current_balances()
 
     if user_balances:
-        return PendingReturnsAnalyticsSchema(children=user_balances).dict(), HTTPStatus.OK
+        return pending_returns(user_balances), HTTPStatus.OK
 
     return jsonify(details="Not Found."), HTTPStatus.NOT_FOUND
 
 
 @analytics.route("/book-status", methods=["GET"])
+@cache.cached
 def get_book_statuses() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    books = Book.query.with_entities(Book.status.label("id"), Book.status.label("label"),
-                                     func.count(Book.status).label("value")).group_by(
-        Book.status).all()
+    books = db.session.execute(book_status_statement()).all()
 
     if books:
         return BookStatusAnalyticsSchema(data=books).dict(), HTTPStatus.OK
@@ -47,12 +66,17 @@ def get_book_statuses() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]
 
 
 @analytics.route("/balances-series", methods=["GET"])
-def get_balance_time_series() -> tuple[Response, HTTPStatus] | tuple[dict, HTTPStatus]:
-    series = UserBalance.query.with_entities(func.date_trunc("day", UserBalance.date_of_entry).label("x"),
-                                             func.sum(UserBalance.balance).label("y")).group_by(
-        func.date_trunc('day', UserBalance.date_of_entry)).all()
+@cache.cached
+@validate(query=BalanceSeriesParameters)
+def get_balance_time_series(query: BalanceSeriesParameters) -> tuple[Response, HTTPStatus] | tuple[dict, HTTPStatus]:
+    series = db.session.execute(balance_series_statement(query)).all()
 
     if series:
         return BalanceSeriesAnalyticsSchema(id="Balances Over Time", data=series).dict(), HTTPStatus.OK
 
     return jsonify(details="Not Found."), HTTPStatus.NOT_FOUND
+
+
+@analytics.route("/cache", methods=["GET"])
+def get_cache_statistics() -> tuple[dict, HTTPStatus]:
+    return cache.stats(), HTTPStatus.OK
@@ -2,40 +2,47 @@ from http import HTTPStatus
 
 import pendulum
 from flask import Blueprint, Response, jsonify
-from sqlalchemy import text
+from sqlalchemy import Select, select
 
-from .schemas import UserBalances
+from .decorators import atomic
+from .schemas import UserBalance as UserBalanceSchema
 from ..extensions import db
-from ..models import User, UserBalance
+from ..models import User, UserBalance, UserCurrentBalance
+from ..serialization import serialize_rows
 
 balances = Blueprint("balances", __name__)
 
 
+def current_balances_statement() -> Select:
+    return select(
+        UserCurrentBalance.user_balance_id.label("id"),
+        UserCurrentBalance.user_id,
+        User.username,
+        UserCurrentBalance.balance,
+        UserCurrentBalance.date_of_entry,
+    ).join(User, User.id == UserCurrentBalance.user_id)
+
+
+def current_balances() -> list:
+    """Every member's latest balance, read from the maintained user_current_balance table"""
+    return db.session.execute(current_balances_statement()).all()
+
+
 @balances.route("/balances/all", methods=["GET"])
 def get_all_user_balances() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    sql = text(
-        """
-            WITH cte AS (
-                SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date_of_entry DESC) row_nums
-                    FROM user_balance
-            )
-            SELECT c.id, c.user_id, u.username, c.balance, c.date_of_entry 
-                FROM cte c INNER JOIN public.user u ON c.user_id = u.id
-                    WHERE c.row_nums = 1
-        """
-    )
-
-    user_balances = db.session.execute(sql).fetchall()
+    user_balances = current_balances()
 
     if user_balances:
-        return UserBalances(balances=user_balances).dict(), HTTPStatus.OK
+        return dict(balances=serialize_rows(UserBalanceSchema, user_balances)), HTTPStatus.OK
 
     return jsonify(details="Not Found."), HTTPStatus.NOT_FOUND
 
 
 @balances.route("/balances/<int:user_id>/clear", methods=["GET"])
+@atomic
 def clear_user_balances(user_id: int) -> tuple[Response, HTTPStatus]:
-    user = User.get_by_id(user_id)
+    # Locked like in borrow/return, so a clear cannot interleave with a desk building on the old balance
+    user = User.get_for_update(user_id, key_share=True)
 
     if user:
         user_balance = UserBalance.create(
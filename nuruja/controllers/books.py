@@ -1,24 +1,64 @@
 from http import HTTPStatus
-from typing import Union
+from typing import Optional, Union
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask.wrappers import Response
 from flask_pydantic import validate
-from sqlalchemy import and_, text
+from sqlalchemy import Select, and_, false, select, true
 
+from .decorators import atomic, conditional, row_version, table_versions
+from .pagination import paginate
 from .schemas import (
-    AllBooksSchema,
+    BookListParameters,
     BookRequestSchema,
     BookResponseSchema,
-    UnavailableBooks,
+    UnavailableBook,
+    UnavailableBooksParameters,
 )
+from .streaming import request_text_stream, stream_ndjson, wants_ndjson
+from ..bulk import FORMATS, guess_format, import_books
 from ..extensions import db
-from ..models import Book
+from ..models import Book, Transactions, User
+from ..serialization import schema_columns, serialize_rows
 
 books = Blueprint("books", __name__)
 
+# Fields of an unavailable book that come from its loan rather than the book itself
+LOAN_FIELDS = ("id", "date_borrowed", "date_due", "book_id", "user_id")
+
+
+def unavailable_books_statement(fields: Optional[tuple[str, ...]] = None) -> Select:
+    """
+    Rented books with the loan behind them, selecting only `fields` when given.
+
+    The latest transaction of each book is found per book through ix_transactions_book_history rather than by
+    numbering every transaction (a return shares its borrow's date, and comes after it by id).
+    """
+    book, user, transactions = Book.__table__, User.__table__, Transactions.__table__
+    latest = (
+        select(*(transactions.c[name] for name in (*LOAN_FIELDS, "is_return")))
+        .where(transactions.c.book_id == book.c.id)
+        .order_by(transactions.c.date_borrowed.desc(), transactions.c.id.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+
+    def column(name: str):
+        if name in LOAN_FIELDS:
+            return latest.c[name]
+
+        return user.c.username if name == "username" else book.c[name]
+
+    return (
+        select(*(column(name) for name in fields or UnavailableBook.__fields__))
+        .select_from(book.join(latest, true()).join(user, user.c.id == latest.c.user_id))
+        .where(book.c.status == "rented", latest.c.is_return == false())
+        .order_by(book.c.title.desc())
+    )
+
 
 @books.route("/books/new", methods=["POST"])
+@atomic
 @validate(body=BookRequestSchema)
 def add_a_book(body: BookRequestSchema) -> tuple[Response, HTTPStatus]:
     book = Book.query.filter(
@@ -44,17 +84,40 @@ def add_a_book(body: BookRequestSchema) -> tuple[Response, HTTPStatus]:
     return jsonify(details="Book added successfully"), HTTPStatus.CREATED
 
 
+@books.route("/books/import", methods=["POST"])
+@atomic
+def bulk_import_books() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
+    file_format = request.args.get("format") or guess_format(content_type=request.content_type)
+
+    if file_format not in FORMATS:
+        return (
+            jsonify(details="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"),
+            HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    report = import_books(request_text_stream(), file_format)
+
+    return report.dict(), HTTPStatus.OK
+
+
 @books.route("/books", methods=["GET"])
-def get_all_books() -> Union[tuple[dict, int], tuple[Response, HTTPStatus]]:
-    all_books = Book.query.all()
+@conditional(table_versions("book"))
+@validate(query=BookListParameters)
+def get_all_books(query: BookListParameters) -> Union[tuple[dict, int], tuple[Response, HTTPStatus], Response]:
+    if wants_ndjson():
+        return stream_ndjson(Book.__table__, BookResponseSchema, after=query.after, fields=query.fields)
+
+    all_books, next_page = paginate(select(*schema_columns(Book, BookResponseSchema, query.selected("id"))), Book.id,
+                                    query.limit, query.after)
 
     if all_books:
-        return AllBooksSchema(books=all_books).dict(), HTTPStatus.OK
+        return dict(books=serialize_rows(BookResponseSchema, all_books, query.fields), next=next_page), HTTPStatus.OK
 
     return jsonify(details="Book[s] not Found"), HTTPStatus.NOT_FOUND
 
 
 @books.route("/books/<int:book_id>", methods=["GET"])
+@conditional(row_version(Book, "book_id"))
 def get_single_book(book_id: int) -> Union[tuple[dict, HTTPStatus], tuple[Response, HTTPStatus]]:
     book = Book.query.filter(Book.id == book_id).first()
 
@@ -65,6 +128,7 @@ def get_single_book(book_id: int) -> Union[tuple[dict, HTTPStatus], tuple[Respon
 
 
 @books.route("/books/<int:book_id>/delete", methods=["DELETE"])
+@atomic
 def remove_book(book_id: int) -> tuple[Response, HTTPStatus]:
     book = Book.query.filter(Book.id == book_id).first()
 
@@ -77,6 +141,7 @@ def remove_book(book_id: int) -> tuple[Response, HTTPStatus]:
 
 
 @books.route("/books/<int:book_id>", methods=["PUT"])
+@atomic
 @validate(body=BookRequestSchema)
 def update_book_details(book_id: int, body: BookRequestSchema) -> tuple[Response, HTTPStatus]:
     book = Book.query.filter(Book.id == book_id).first()
@@ -98,37 +163,28 @@ def update_book_details(book_id: int, body: BookRequestSchema) -> tuple[Response
 
 
 @books.route("/books/available", methods={"GET"})
-def get_available_books() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    available_books = Book.query.filter(Book.status == "not-rented").all()
+@conditional(table_versions("book"))
+@validate(query=BookListParameters)
+def get_available_books(query: BookListParameters) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
+    available_books, next_page = paginate(
+        select(*schema_columns(Book, BookResponseSchema, query.selected("id"))).where(Book.status == "not-rented"),
+        Book.id, query.limit, query.after
+    )
 
     if available_books:
-        return AllBooksSchema(books=available_books).dict(), HTTPStatus.OK
+        return (dict(books=serialize_rows(BookResponseSchema, available_books, query.fields), next=next_page),
+                HTTPStatus.OK)
 
     return jsonify(details="No Books Available"), HTTPStatus.NOT_FOUND
 
 
 @books.route("/books/unavailable", methods=["GET"])
-def get_unavailable_books() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    query = text(
-        """
-        WITH cte AS (
-            SELECT *,ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY date_borrowed DESC) row_nums
-                FROM transactions
-        )
-        
-        SELECT b.title, b.status, u.username, c.date_borrowed, c.date_due, c.is_return, b.date_of_publication, c.id,
-            b.rent_fee, b.late_penalty_fee, b.author, b.isbn, c.book_id, c.user_id
-            FROM cte c inner join book b ON c.book_id = b.id
-                INNER JOIN public.USER u ON u.id = c.user_id
-                WHERE c.row_nums = 1 AND c.is_return = FALSE
-                    AND b.status = 'rented'
-                ORDER BY b.title DESC
-        """
-    )
-
-    unavailable_books = db.session.execute(query).fetchall()
+@conditional(table_versions("book", "transactions", "user"))
+@validate(query=UnavailableBooksParameters)
+def get_unavailable_books(query: UnavailableBooksParameters) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
+    unavailable_books = db.session.execute(unavailable_books_statement(query.fields)).all()
 
     if unavailable_books:
-        return UnavailableBooks(books=unavailable_books).dict(), HTTPStatus.OK
+        return dict(books=serialize_rows(UnavailableBook, unavailable_books, query.fields)), HTTPStatus.OK
 
     return jsonify(details="No Books Rented Out"), HTTPStatus.NOT_FOUND
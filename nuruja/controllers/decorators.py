@@ -0,0 +1,130 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from http import HTTPStatus
+from typing import Callable, Iterable, Optional
+
+from flask import make_response, request
+from flask.wrappers import Response
+from sqlalchemy import Select, select
+from werkzeug.http import parse_date, parse_etags
+
+from ..extensions import db
+from ..models import TableVersion
+from ..models.mixins import unit_of_work
+
+
+def atomic(view: Callable) -> Callable:
+    """
+    Runs a write endpoint as a single unit of work.
+
+    Everything the view writes is committed once, after it returns successfully. Error responses (4xx/5xx) and
+    exceptions roll the whole request back, so a rejected request leaves nothing half-written.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs) -> Response:
+        with unit_of_work() as work:
+            response = make_response(view(*args, **kwargs))
+
+            if response.status_code >= HTTPStatus.BAD_REQUEST:
+                work.discard()
+
+        return response
+
+    return wrapper
+
+
+def conditional(validators: Callable[..., Optional[tuple[str, Optional[datetime]]]]) -> Callable:
+    """
+    Adds ETag/Last-Modified to a GET endpoint and answers 304 Not Modified when the client's copy is current.
+
+    `validators` receives the view's arguments and returns `(etag, last_modified)` from a cheap version lookup, or
+    None when there is nothing to validate against (the view then runs and answers as usual, e.g. with a 404). The
+    view itself, its query and its serialization only run when the client needs a new body.
+    """
+
+    def decorate(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Response:
+            found = validators(*args, **kwargs)
+
+            if found is None:
+                return make_response(view(*args, **kwargs))
+
+            etag, last_modified = found
+            not_modified = is_not_modified(etag, last_modified, request.headers.get("If-None-Match"),
+                                           request.headers.get("If-Modified-Since"))
+
+            response = Response(status=HTTPStatus.NOT_MODIFIED) if not_modified else make_response(
+                view(*args, **kwargs)
+            )
+
+            if response.status_code in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.vary.add("Accept")
+
+            return response
+
+        return wrapper
+
+    return decorate
+
+
+def is_not_modified(etag: str, last_modified: Optional[datetime], if_none_match: Optional[str],
+                    if_modified_since: Optional[str]) -> bool:
+    """Whether the client's copy, described by its conditional request headers, is still current."""
+    if if_none_match:
+        return parse_etags(if_none_match).contains(etag)
+
+    since = parse_date(if_modified_since)
+
+    return bool(last_modified and since and last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since)
+
+
+def table_versions_statement(tables: Iterable[str]) -> Select:
+    return select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at).where(
+        TableVersion.table_name.in_(tables)
+    ).order_by(TableVersion.table_name)
+
+
+def collection_etag(versions: Iterable, full_path: str, accept: str) -> tuple[str, Optional[datetime]]:
+    """ETag and Last-Modified of a collection, from the versions of the tables it reads and the request it answers."""
+    versions = list(versions)
+    fingerprint = "|".join(
+        [*(f"{version.table_name}:{version.version}" for version in versions), full_path, accept]
+    )
+    last_modified = max((version.updated_at for version in versions), default=None)
+
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest(), last_modified
+
+
+def row_etag(table: str, row_id: int, updated_at: datetime) -> str:
+    return f"{table}-{row_id}-{updated_at.timestamp():.6f}"
+
+
+def table_versions(*tables: str) -> Callable[..., tuple[str, Optional[datetime]]]:
+    """Validators for a collection: the versions of the tables it reads, plus the query string and Accept header."""
+
+    def validators(*args, **kwargs) -> tuple[str, Optional[datetime]]:
+        versions = db.session.execute(table_versions_statement(tables))
+
+        return collection_etag(versions, request.full_path, request.headers.get("Accept", ""))
+
+    return validators
+
+
+def row_version(model, argument: str) -> Callable[..., Optional[tuple[str, datetime]]]:
+    """Validators for a single row: its `updated_at`, looked up by primary key from the view argument `argument`."""
+
+    def validators(*args, **kwargs) -> Optional[tuple[str, datetime]]:
+        row_id = kwargs[argument]
+        updated_at = db.session.query(model.updated_at).filter(model.id == row_id).scalar()
+
+        if updated_at is None:
+            return None
+
+        return row_etag(model.__tablename__, row_id, updated_at), updated_at
+
+    return validators
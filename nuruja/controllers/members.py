@@ -1,27 +1,40 @@
 from http import HTTPStatus
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask.wrappers import Response
 from flask_pydantic import validate
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 
-from .schemas import AllMembersSchema, MemberRequestSchema, MemberResponseSchema
+from .decorators import atomic, conditional, row_version, table_versions
+from .pagination import paginate
+from .schemas import MemberListParameters, MemberRequestSchema, MemberResponseSchema
+from .streaming import request_text_stream, stream_ndjson, wants_ndjson
+from ..bulk import FORMATS, guess_format, import_members
 from ..models import User
+from ..serialization import schema_columns, serialize_rows
 
 members = Blueprint("members", __name__)
 
 
 @members.route("/members", methods=["GET"])
-def get_all_members() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    all_users = User.query.all()
+@conditional(table_versions("user"))
+@validate(query=MemberListParameters)
+def get_all_members(query: MemberListParameters) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus] | Response:
+    if wants_ndjson():
+        return stream_ndjson(User.__table__, MemberResponseSchema, after=query.after, fields=query.fields)
+
+    all_users, next_page = paginate(select(*schema_columns(User, MemberResponseSchema, query.selected("id"))),
+                                    User.id, query.limit, query.after)
 
     if all_users:
-        return AllMembersSchema(members=all_users).dict(), HTTPStatus.OK
+        return (dict(members=serialize_rows(MemberResponseSchema, all_users, query.fields), next=next_page),
+                HTTPStatus.OK)
 
     return jsonify(details="No Users"), HTTPStatus.NOT_FOUND
 
 
 @members.route("/members/new", methods=["POST"])
+@atomic
 @validate(body=MemberResponseSchema)
 def add_member(body: MemberRequestSchema) -> tuple[Response, HTTPStatus]:
     existing_user: User = User.query.filter(
@@ -54,7 +67,24 @@ def add_member(body: MemberRequestSchema) -> tuple[Response, HTTPStatus]:
     return jsonify(details="User added successfully"), HTTPStatus.CREATED
 
 
+@members.route("/members/import", methods=["POST"])
+@atomic
+def bulk_import_members() -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
+    file_format = request.args.get("format") or guess_format(content_type=request.content_type)
+
+    if file_format not in FORMATS:
+        return (
+            jsonify(details="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"),
+            HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    report = import_members(request_text_stream(), file_format)
+
+    return report.dict(), HTTPStatus.OK
+
+
 @members.route("/members/<int:user_id>", methods=["GET"])
+@conditional(row_version(User, "user_id"))
 def get_single_member(user_id: int) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
     user = User.query.filter(User.id == user_id).first()
 
@@ -65,6 +95,7 @@ def get_single_member(user_id: int) -> tuple[dict, HTTPStatus] | tuple[Response,
 
 
 @members.route("/members/<int:user_id>/delete", methods=["DELETE"])
+@atomic
 def remove_single_member(user_id: int) -> tuple[Response, HTTPStatus]:
     user = User.query.filter(User.id == user_id).first()
 
@@ -77,6 +108,7 @@ def remove_single_member(user_id: int) -> tuple[Response, HTTPStatus]:
 
 
 @members.route("/members/<int:user_id>", methods=["PUT"])
+@atomic
 @validate(body=MemberRequestSchema)
 def update_single_member(
         user_id: int, body: MemberRequestSchema
@@ -0,0 +1,12 @@
+from flask import Blueprint
+from flask.wrappers import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from ..instrumentation import render_metrics
+
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.route("/metrics", methods=["GET"])
+def get_metrics() -> Response:
+    return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
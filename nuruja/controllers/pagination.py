@@ -0,0 +1,53 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from flask import request, url_for
+from sqlalchemy import Select
+from sqlalchemy.orm import InstrumentedAttribute
+
+from ..extensions import db
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor pointing just past the row with the given id."""
+    payload = json.dumps({"id": last_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(payload["id"])
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+
+
+def paginate(statement: Select, column: InstrumentedAttribute, limit: int,
+             after: Optional[int] = None) -> tuple[list, Optional[str]]:
+    """
+    Keyset pagination over an indexed, unique column, returning result rows.
+
+    Fetches one row more than requested to find out whether there is a next page, and builds the `next` link from
+    the current request so any other query string parameters are carried along.
+    """
+    if after is not None:
+        statement = statement.where(column > after)
+
+    rows = db.session.execute(statement.order_by(column).limit(limit + 1)).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    arguments = {
+        **request.args.to_dict(),
+        **(request.view_args or {}),
+        "limit": limit,
+        "after": encode_cursor(getattr(rows[-1], column.key)),
+    }
+
+    return rows, url_for(request.endpoint, **arguments)
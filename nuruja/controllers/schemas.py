@@ -1,7 +1,11 @@
-from typing import Optional
+from datetime import date
+from typing import ClassVar, Literal, Optional, Type
 
 from pendulum import DateTime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, conint, conlist, validator
+
+from configs import configs
+from .pagination import decode_cursor
 
 
 class BaseSchema(BaseModel):
@@ -10,6 +14,52 @@ class BaseSchema(BaseModel):
         allow_population_by_field_name = True
 
 
+class PaginationParameters(BaseSchema):
+    limit: Optional[conint(ge=1)] = None
+    after: Optional[int] = None
+
+    @validator("limit", always=True)
+    def cap_limit(cls, value: Optional[int]) -> int:
+        # The default is read per request: a class default would parse the settings when the module is imported
+        return min(value or configs.PAGE_SIZE, configs.MAX_PAGE_SIZE)
+
+    @validator("after", pre=True)
+    def decode_after(cls, value: Optional[str]) -> Optional[int]:
+        if value in (None, ""):
+            return None
+        return decode_cursor(value)
+
+
+class FieldsParameters(BaseSchema):
+    """
+    `?fields=id,title` sparse fieldsets: only these fields of `response_schema` are selected and serialized
+    """
+
+    response_schema: ClassVar[Type[BaseSchema]]
+
+    fields: Optional[tuple[str, ...]] = None
+
+    @validator("fields", pre=True)
+    def split_fields(cls, value: Optional[str | list[str]]) -> Optional[tuple[str, ...]]:
+        if not value:
+            return None
+
+        # flask_pydantic hands sequence fields over as every value given, so `?fields=a&fields=b,c` works too
+        values = [value] if isinstance(value, str) else value
+        names = tuple(dict.fromkeys(name.strip() for item in values for name in item.split(",") if name.strip()))
+        unknown = [name for name in names if name not in cls.response_schema.__fields__]
+
+        if unknown:
+            raise ValueError(f"Unknown field[s]: {', '.join(unknown)}")
+
+        # In the schema's order, so `?fields=b,a` selects and serializes exactly like `?fields=a,b`
+        return tuple(name for name in cls.response_schema.__fields__ if name in names) or None
+
+    def selected(self, *required: str) -> Optional[tuple[str, ...]]:
+        """The fields to select: the requested ones plus any the view needs itself, or None for all of them"""
+        return tuple(dict.fromkeys((*required, *self.fields))) if self.fields else None
+
+
 class MemberRequestSchema(BaseSchema):
     username: str
     email: str
@@ -24,6 +74,7 @@ class MemberResponseSchema(MemberRequestSchema):
 
 class AllMembersSchema(BaseSchema):
     members: Optional[list[MemberResponseSchema]]
+    next: Optional[str] = None
 
 
 class BookRequestSchema(BaseSchema):
@@ -40,14 +91,42 @@ class BookResponseSchema(BookRequestSchema):
     id: int
 
 
+class BookImportSchema(BookRequestSchema):
+    status: str = "not-rented"
+    rent_fee: int = 100
+    late_penalty_fee: int = 25
+
+    @validator("date_of_publication", pre=True)
+    def accept_plain_dates(cls, value):
+        # Catalog exports usually carry a bare YYYY-MM-DD
+        if isinstance(value, str) and len(value) == 10:
+            return f"{value}T00:00:00"
+        return value
+
+
 class AllBooksSchema(BaseSchema):
     books: list[BookResponseSchema]
+    next: Optional[str] = None
 
 
 class BorrowBookSchema(BaseSchema):
     book_id: int
 
 
+class BatchBorrowSchema(BaseSchema):
+    book_ids: conlist(int, min_items=1, max_items=50)
+
+
+class BookTransactionStatus(BaseSchema):
+    book_id: int
+    status: str
+
+
+class BatchTransactionSchema(BaseSchema):
+    details: str
+    books: list[BookTransactionStatus]
+
+
 class UnavailableBook(BookResponseSchema):
     username: str
     date_borrowed: DateTime
@@ -60,6 +139,18 @@ class UnavailableBooks(BaseSchema):
     books: list[UnavailableBook]
 
 
+class BookListParameters(PaginationParameters, FieldsParameters):
+    response_schema = BookResponseSchema
+
+
+class MemberListParameters(PaginationParameters, FieldsParameters):
+    response_schema = MemberResponseSchema
+
+
+class UnavailableBooksParameters(FieldsParameters):
+    response_schema = UnavailableBook
+
+
 class UserBalance(BaseSchema):
     id: int
     user_id: int
@@ -76,8 +167,26 @@ class ClearUserBalancesSchema(BaseSchema):
     user_id: int
 
 
+class RejectedRowSchema(BaseSchema):
+    line: int
+    reason: str
+
+
+class ImportReportSchema(BaseSchema):
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    errors: list[RejectedRowSchema] = []
+
+
 class SearchParameters(BaseSchema):
     parameters: str = ""
+    limit: Optional[conint(ge=1)] = None
+    offset: conint(ge=0) = 0
+
+    @validator("limit", always=True)
+    def cap_limit(cls, value: Optional[int]) -> int:
+        return min(value or configs.PAGE_SIZE, configs.MAX_PAGE_SIZE)
 
 
 # The following are schemas for analytics component of the web application.
@@ -102,6 +211,12 @@ class SeriesSchema(BaseSchema):
     y: int
 
 
+class BalanceSeriesParameters(BaseSchema):
+    from_: Optional[date] = Field(None, alias="from")
+    to: Optional[date] = None
+    granularity: Literal["day", "week", "month"] = "day"
+
+
 class BalanceSeriesAnalyticsSchema(BaseSchema):
     id: str = "Balance Amount Over Time"
     data: list[SeriesSchema]
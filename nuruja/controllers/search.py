@@ -1,20 +1,61 @@
+import re
 from http import HTTPStatus
 
 from flask import Blueprint, jsonify, Response
 from flask_pydantic import validate
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 
 from .schemas import SearchParameters, AllBooksSchema
 from ..models import Book
 
 search = Blueprint("search", __name__)
 
+ISBN_PATTERN = re.compile(r"^(?:\d[\s-]?){9}[\dXx]$|^(?:\d[\s-]?){12}\d$")
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def rank_books(term: str, limit: int, offset: int = 0) -> list[Book]:
+    """
+    Relevance ranked search over book titles and authors.
+
+    Whole words are matched through the `search_vector` GIN index and partial words through the trigram indexes on
+    `title` and `author`. Full-text matches rank first, then the closest trigram matches.
+    """
+    term = term.strip()
+
+    if not term:
+        return Book.query.order_by(Book.id).offset(offset).limit(limit).all()
+
+    if ISBN_PATTERN.match(term):
+        isbn = re.sub(r"[\s-]", "", term)
+        matches = Book.query.filter(Book.isbn.in_({term, isbn}))
+        books = matches.order_by(Book.id).offset(offset).limit(limit).all()
+
+        # A page past the last match still belongs to the ISBN results, rather than to a search of the text
+        if books or (offset and matches.first() is not None):
+            return books
+
+    query = func.websearch_to_tsquery("english", term)
+    pattern = f"%{escape_like(term)}%"
+    rank = func.ts_rank_cd(Book.search_vector, query)
+    similarity = func.greatest(func.similarity(Book.title, term), func.similarity(Book.author, term))
+
+    return Book.query.filter(
+        or_(
+            Book.search_vector.op("@@")(query),
+            Book.title.ilike(pattern, escape="\\"),
+            Book.author.ilike(pattern, escape="\\"),
+        )
+    ).order_by(rank.desc(), similarity.desc(), Book.id).offset(offset).limit(limit).all()
+
 
 @search.route("/filter", methods=["POST"])
 @validate(body=SearchParameters)
 def search_for_book(body: SearchParameters) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
-    books_search_results = Book.query.filter(
-        or_(Book.title.ilike(f'%{body.parameters}%'), Book.author.ilike(f"%{body.parameters}%"))).all()
+    books_search_results = rank_books(body.parameters, body.limit, body.offset)
 
     if books_search_results:
         return AllBooksSchema(books=books_search_results).dict(), HTTPStatus.OK
@@ -0,0 +1,55 @@
+import io
+from typing import Iterator, Optional, TextIO, Type
+
+import orjson
+from flask import Response, request, stream_with_context
+from sqlalchemy import Table, select
+from werkzeug.datastructures import MIMEAccept
+
+from .schemas import BaseSchema
+from ..extensions import db
+from ..serialization import row_serializer
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson() -> bool:
+    """True when the client asked for newline delimited JSON via `?format=ndjson` or the Accept header."""
+    return prefers_ndjson(request.args.get("format"), request.accept_mimetypes)
+
+
+def prefers_ndjson(format_argument: Optional[str], accept: MIMEAccept) -> bool:
+    if format_argument == "ndjson":
+        return True
+
+    return accept.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_ndjson(table: Table, schema: Type[BaseSchema], after: Optional[int] = None,
+                  fields: Optional[tuple[str, ...]] = None, batch_size: int = 1000) -> Response:
+    """
+    Streams every row of `table` as one JSON document per line.
+
+    Rows are read from a server-side cursor `batch_size` at a time and serialized as they arrive, so memory use does
+    not grow with the size of the table. `after` lets an interrupted export resume past the last id it received,
+    and `fields` narrows every line to those fields.
+    """
+    columns = [table.c[name] for name in fields or schema.__fields__]
+    statement = select(*columns).order_by(table.c.id).execution_options(yield_per=batch_size)
+
+    if after is not None:
+        statement = statement.where(table.c.id > after)
+
+    serialize = row_serializer(schema, tuple(fields or schema.__fields__), fields)
+
+    def generate() -> Iterator[bytes]:
+        for row in db.session.execute(statement):
+            yield orjson.dumps(serialize(row)) + b"\n"
+
+    # Stop the nginx reverse proxy from buffering the whole export before passing it on
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers={"X-Accel-Buffering": "no"})
+
+
+def request_text_stream() -> TextIO:
+    """The request body as text, read as it arrives instead of buffered whole."""
+    return io.TextIOWrapper(io.BufferedReader(request.stream), encoding="utf-8", newline="")
@@ -1,27 +1,67 @@
+from datetime import timezone
 from http import HTTPStatus
 
 import pendulum
-import pytz
 from flask import Blueprint, jsonify
 from flask.wrappers import Response
 from flask_pydantic import validate
+from flask_sqlalchemy.query import Query
 from sqlalchemy import and_, desc
 
-from .schemas import BorrowBookSchema
-from ..models import Book, Transactions, User, UserBalance
+from .decorators import atomic
+from .schemas import BatchBorrowSchema, BatchTransactionSchema, BorrowBookSchema
+from ..extensions import db
+from ..models import Book, Transactions, User, UserBalance, UserCurrentBalance
+from ..models.mixins import RowLocked
 
 transactions = Blueprint("transactions", __name__)
 
+BALANCE_CUT_OFF = 500
+
+
+@transactions.errorhandler(RowLocked)
+def book_locked(error: RowLocked) -> tuple[Response, HTTPStatus]:
+    return jsonify(details="The book is being processed at another desk. Please retry"), HTTPStatus.CONFLICT
+
+
+def lock_member_and_book(user_id: int, book_id: int) -> tuple[User | None, Book | None]:
+    """
+    Locks the member, then the book, for the rest of the transaction.
+
+    The member lock serializes balance entries for one member, so two desks never build on the same previous
+    balance. The book lock fails fast with RowLocked if another desk is already lending or receiving it. Locks are
+    always taken in this order to avoid deadlocks.
+    """
+    user = User.get_for_update(user_id, key_share=True)
+    book = Book.get_for_update(book_id, nowait=True, key_share=True) if user else None
+
+    return user, book
+
+
+def latest_borrow(book_id: int, user_id: int) -> Query:
+    """The member's latest borrow of the book, the loan a return closes (ix_transactions_open_borrows)"""
+    return Transactions.query.filter(
+        and_(Transactions.book_id == book_id, Transactions.user_id == user_id, Transactions.is_return == False)
+    ).order_by(desc(Transactions.date_borrowed))
+
+
+def latest_borrows_of(book_ids: list[int]) -> Query:
+    """The latest borrow of each book, whoever made it"""
+    return Transactions.query.filter(
+        Transactions.book_id.in_(book_ids), Transactions.is_return == False
+    ).order_by(Transactions.book_id, desc(Transactions.date_borrowed)).distinct(Transactions.book_id)
+
 
 @transactions.route("/members/<int:user_id>/borrow", methods=["POST"])
+@atomic
 @validate(body=BorrowBookSchema)
 def initiate_borrow(
         user_id: int, body: BorrowBookSchema
 ) -> tuple[Response, HTTPStatus]:
-    user = User.get_by_id(user_id)
-    book = Book.query.filter(
-        and_(Book.id == body.book_id, Book.status != "rented")
-    ).first()
+    user, book = lock_member_and_book(user_id, body.book_id)
+
+    if book and book.status == "rented":
+        book = None
 
     if user and book:
         new_borrow = Transactions.create(
@@ -33,16 +73,12 @@ def initiate_borrow(
             date_due=pendulum.now() + pendulum.duration(days=14),
         )
 
-        previous_balance = (
-            UserBalance.query.filter(UserBalance.user_id == user.id)
-            .order_by(desc(UserBalance.date_of_entry))
-            .first()
-        )
+        previous_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == user.id).first()
 
         if previous_balance:
             new_amount = (previous_balance.balance + book.rent_fee)
 
-            if new_amount <= 500:
+            if new_amount <= BALANCE_CUT_OFF:
                 new_balance = UserBalance.create(
                     user_id=user.id,
                     balance=new_amount,
@@ -83,41 +119,38 @@ def initiate_borrow(
 
 
 @transactions.route("/members/<int:user_id>/return", methods=["POST"])
+@atomic
 @validate(body=BorrowBookSchema)
 def initiate_book_return(
         user_id: int, body: BorrowBookSchema
 ) -> tuple[Response, HTTPStatus]:
-    user = User.get_by_id(user_id)
-    book = Book.query.filter(
-        and_(Book.id == body.book_id, Book.status == "rented")
-    ).first()
-    utc = pytz.UTC
+    user, book = lock_member_and_book(user_id, body.book_id)
+    utc = timezone.utc
+
+    if book and book.status != "rented":
+        book = None
 
     if user and book:
-        initial_borrow = Transactions.query.filter(
-            and_(Transactions.book_id == book.id, Transactions.user_id == user.id, Transactions.is_return == False)
-        ).order_by(desc(Transactions.date_borrowed)).first()
-
-        previous_balance = (
-            UserBalance.query.filter(UserBalance.user_id == user.id)
-            .order_by(desc(UserBalance.date_of_entry))
-            .first()
-        )
+        initial_borrow = latest_borrow(book.id, user.id).first()
+
+        previous_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == user.id).first()
 
         # If late to return
         if pendulum.now().replace(tzinfo=utc) > initial_borrow.date_due.replace(tzinfo=utc):
+            # Unless the overdue sweep has charged it already
+            penalty = 0 if initial_borrow.penalty_applied else book.late_penalty_fee
             late_return = Transactions.create(
                 user_id=user.id,
                 book_id=book.id,
                 is_return=True,
-                rent_fee=book.late_penalty_fee,
+                rent_fee=penalty,
                 date_borrowed=initial_borrow.date_borrowed,
                 date_due=pendulum.now(),
             )
 
             new_balance = UserBalance.create(
                 user_id=user.id,
-                balance=((previous_balance.balance - book.rent_fee) + book.late_penalty_fee),
+                balance=((previous_balance.balance - book.rent_fee) + penalty),
                 date_of_entry=pendulum.now(),
                 transaction_id=late_return.id,
             )
@@ -126,9 +159,10 @@ def initiate_book_return(
             new_balance.save()
             late_return.save()
 
-            return (
-                jsonify(details=f"Late return noted. Fee of {book.late_penalty_fee} applied"), HTTPStatus.OK,
-            )
+            if initial_borrow.penalty_applied:
+                return jsonify(details="Late return noted. Late fee already charged"), HTTPStatus.OK
+
+            return jsonify(details=f"Late return noted. Fee of {penalty} applied"), HTTPStatus.OK
 
         # If returning on time
         new_return = Transactions.create(
@@ -161,3 +195,131 @@ def initiate_book_return(
 
     if not book:
         return jsonify(details="The book has not been rented out"), HTTPStatus.NOT_FOUND
+
+
+def lock_books(book_ids: list[int], status_filter) -> dict[int, Book]:
+    """
+    Locks whichever of the books match `status_filter` in a single IN query.
+
+    Books another desk is holding are skipped rather than waited on, and reported back as unavailable.
+    """
+    books = Book.query.filter(Book.id.in_(book_ids), status_filter).order_by(Book.id).with_for_update(
+        key_share=True, skip_locked=True
+    ).populate_existing().all()
+
+    return {book.id: book for book in books}
+
+
+@transactions.route("/members/<int:user_id>/borrow/batch", methods=["POST"])
+@atomic
+@validate(body=BatchBorrowSchema)
+def initiate_batch_borrow(
+        user_id: int, body: BatchBorrowSchema
+) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
+    user = User.get_for_update(user_id, key_share=True)
+
+    if not user:
+        return (
+            jsonify(details="The user is not registered. Please register"),
+            HTTPStatus.NOT_FOUND,
+        )
+
+    book_ids = list(dict.fromkeys(body.book_ids))
+    books = lock_books(book_ids, Book.status != "rented")
+    statuses = [dict(book_id=book_id, status="borrowed" if book_id in books else "unavailable") for book_id in book_ids]
+
+    if not books:
+        return BatchTransactionSchema(details="None of the books are available for renting",
+                                      books=statuses).dict(), HTTPStatus.NOT_FOUND
+
+    previous_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == user.id).first()
+    new_amount = (previous_balance.balance if previous_balance else 0) + sum(book.rent_fee for book in books.values())
+
+    if new_amount > BALANCE_CUT_OFF:
+        return jsonify(
+            details="Balance is/will be above cut-off. Cannot rent to member"), HTTPStatus.NOT_ACCEPTABLE
+
+    now = pendulum.now()
+
+    for book in books.values():
+        book.status = "rented"
+
+    db.session.add_all(
+        Transactions(
+            user_id=user.id,
+            book_id=book.id,
+            rent_fee=book.rent_fee,
+            is_return=False,
+            date_borrowed=now,
+            date_due=now + pendulum.duration(days=14),
+        )
+        for book in books.values()
+    )
+
+    # One ledger entry covers the whole batch, so it is not tied to a single transaction
+    UserBalance.create(user_id=user.id, balance=new_amount, date_of_entry=now)
+
+    return BatchTransactionSchema(details="Borrow Initiated", books=statuses).dict(), HTTPStatus.OK
+
+
+@transactions.route("/members/<int:user_id>/return/batch", methods=["POST"])
+@atomic
+@validate(body=BatchBorrowSchema)
+def initiate_batch_return(
+        user_id: int, body: BatchBorrowSchema
+) -> tuple[dict, HTTPStatus] | tuple[Response, HTTPStatus]:
+    user = User.get_for_update(user_id, key_share=True)
+
+    if not user:
+        return (
+            jsonify(details="The user is not registered. Please register"),
+            HTTPStatus.NOT_FOUND,
+        )
+
+    book_ids = list(dict.fromkeys(body.book_ids))
+    books = lock_books(book_ids, Book.status == "rented")
+
+    # Latest borrow of each book; it only counts if this member is the one holding it
+    latest_borrows = latest_borrows_of(list(books)).all()
+    loans = {loan.book_id: loan for loan in latest_borrows if loan.user_id == user.id}
+
+    if not loans:
+        statuses = [dict(book_id=book_id, status="not-rented-out") for book_id in book_ids]
+        return BatchTransactionSchema(details="None of the books have been rented out to the member",
+                                      books=statuses).dict(), HTTPStatus.NOT_FOUND
+
+    previous_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == user.id).first()
+    new_amount = previous_balance.balance if previous_balance else 0
+    now = pendulum.now()
+    utc = timezone.utc
+    statuses = []
+
+    for book_id in book_ids:
+        loan = loans.get(book_id)
+
+        if not loan:
+            statuses.append(dict(book_id=book_id, status="not-rented-out"))
+            continue
+
+        book = books[book_id]
+        is_late = now.replace(tzinfo=utc) > loan.date_due.replace(tzinfo=utc)
+        penalty = book.late_penalty_fee if is_late and not loan.penalty_applied else 0
+
+        book.status = "not-rented"
+        db.session.add(
+            Transactions(
+                user_id=user.id,
+                book_id=book.id,
+                is_return=True,
+                rent_fee=penalty,
+                date_borrowed=loan.date_borrowed,
+                date_due=now,
+            )
+        )
+
+        new_amount = new_amount - book.rent_fee + penalty
+        statuses.append(dict(book_id=book_id, status="returned-late" if is_late else "returned"))
+
+    UserBalance.create(user_id=user.id, balance=new_amount, date_of_entry=now)
+
+    return BatchTransactionSchema(details="Return Initiated", books=statuses).dict(), HTTPStatus.OK
@@ -2,6 +2,12 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from .cache import ResponseCache
+from .routing import ReadReplicas, RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 cors = CORS()
 migrations = Migrate()
+cache = ResponseCache(tables=["book", "user", "user_balance", "transactions", "balance_daily_rollup",
+                                    "book_status_counts"])
+replicas = ReadReplicas()
@@ -0,0 +1,107 @@
+"""
+Per-request latency, response size and SQL instrumentation, exported in the Prometheus text format at /metrics.
+
+Under gunicorn every worker has its own copy of the metrics. When `PROMETHEUS_MULTIPROC_DIR` is set (see init.sh and
+gunicorn.conf.py) the workers write them to files in that directory instead, and /metrics adds them up whichever
+worker serves it.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from flask import Flask, g, request
+from flask.wrappers import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_MIMETYPE = CONTENT_TYPE_LATEST.split(";")[0]
+
+REQUEST_LATENCY = Histogram(
+    "nuruja_request_duration_seconds", "Time spent serving a request.", ["method", "endpoint", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_SIZE = Histogram(
+    "nuruja_response_size_bytes", "Size of response bodies.", ["method", "endpoint"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "nuruja_request_sql_statements", "SQL statements run by a request.", ["method", "endpoint"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_SQL_DURATION = Histogram(
+    "nuruja_request_sql_duration_seconds", "Time a request spent running SQL statements.", ["method", "endpoint"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class SqlTally:
+    """Number and total duration of the SQL statements run on behalf of one request"""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# A context variable rather than flask.g, so statements run by the async views (asgi.py) are counted as well
+REQUEST_SQL: ContextVar[Optional[SqlTally]] = ContextVar("request_sql", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(connection, cursor, statement, parameters, context, executemany) -> None:
+    connection.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def tally_statement(connection, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - connection.info["statement_started"].pop()
+    tally = REQUEST_SQL.get()
+
+    if tally is not None:
+        tally.statements += 1
+        tally.seconds += elapsed
+
+
+def observe(method: str, endpoint: str, status: int, seconds: float, size: Optional[int], tally: SqlTally) -> None:
+    REQUEST_LATENCY.labels(method, endpoint, status).observe(seconds)
+    REQUEST_SQL_STATEMENTS.labels(method, endpoint).observe(tally.statements)
+    REQUEST_SQL_DURATION.labels(method, endpoint).observe(tally.seconds)
+
+    # Streamed responses (NDJSON exports) have no known size
+    if size is not None:
+        RESPONSE_SIZE.labels(method, endpoint).observe(size)
+
+
+def instrument(app: Flask) -> None:
+    """Times every request of `app` and counts the SQL it runs, labelled by its endpoint (blueprint.view)."""
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.request_started = time.perf_counter()
+        g.request_sql = REQUEST_SQL.set(SqlTally())
+
+    @app.after_request
+    def observe_request(response: Response) -> Response:
+        if "request_started" in g:
+            # Unmatched URLs are lumped together, so that scanners cannot create a label per path
+            observe(request.method, request.endpoint or "unmatched", response.status_code,
+                    time.perf_counter() - g.request_started, response.content_length, REQUEST_SQL.get())
+            REQUEST_SQL.reset(g.pop("request_sql"))
+
+        return response
+
+
+def metrics_registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return registry
+
+
+def render_metrics() -> bytes:
+    return generate_latest(metrics_registry())
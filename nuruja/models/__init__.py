@@ -1,7 +1,31 @@
+from collections import Counter
+
 import pendulum
+from sqlalchemy import Date, cast, event, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
+from sqlalchemy.orm import Session, object_session
 
+from .tracking import WRITTEN_TABLES, mark_written
 from .mixins import CRUDMixin
 from ..extensions import db
+from ..signals import tables_committed
+
+# The status changes of a session's flushed books, applied to book_status_counts once it commits
+BOOK_STATUS_DELTAS = "book_status_deltas"
+
+# The ledger entries a session inserted, added to balance_daily_rollup once it commits
+ROLLUP_ENTRIES = "rollup_entries"
+
+# Titles weigh more than authors when ranking search results
+BOOK_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B')"
+)
+
+# The trigram indexes on book need pg_trgm to exist before the tables are created
+event.listen(
+    db.metadata, "before_create", db.DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
 
 
 class User(db.Model, CRUDMixin):
@@ -27,6 +51,14 @@ class User(db.Model, CRUDMixin):
 
 class Book(db.Model, CRUDMixin):
     __tablename__ = "book"
+    __table_args__ = (
+        db.Index("ix_book_search_vector", "search_vector", postgresql_using="gin"),
+        db.Index("ix_book_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        db.Index("ix_book_author_trgm", "author", postgresql_using="gin", postgresql_ops={"author": "gin_trgm_ops"}),
+        # Pages of available or rented books, in id order
+        db.Index("ix_book_status_id", "status", "id"),
+        {"extend_existing": True},
+    )
 
     title = db.Column(db.String(100), nullable=False, unique=False)
     author = db.Column(db.String(120), nullable=False, unique=False)
@@ -39,9 +71,11 @@ class Book(db.Model, CRUDMixin):
     )
     rent_fee = db.Column(db.Integer, nullable=False, unique=False, default=100)
     late_penalty_fee = db.Column(db.Integer, nullable=False, unique=False, default=25)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(BOOK_SEARCH_DOCUMENT, persisted=True)))
 
     # Relationship[s]
-    transactions = db.relationship("Transactions", back_populates="book", uselist=False)
+    # Left to the database, which deletes a book's transactions and their ledger entries with it
+    transactions = db.relationship("Transactions", back_populates="book", uselist=False, passive_deletes=True)
 
     def __repr__(self) -> str:
         return f"<Book {self.title} - {self.author}>"
@@ -49,9 +83,19 @@ class Book(db.Model, CRUDMixin):
 
 class Transactions(db.Model, CRUDMixin):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Latest transaction of a book (/books/unavailable)
+        db.Index("ix_transactions_book_history", "book_id", db.text("date_borrowed DESC"), db.text("id DESC")),
+        # The loan a return closes: the member's latest borrow of the book
+        db.Index("ix_transactions_open_borrows", "book_id", "user_id", db.text("date_borrowed DESC"),
+                 postgresql_where=db.text("NOT is_return")),
+        {"extend_existing": True},
+    )
 
     rent_fee = db.Column(db.Float, default=100, nullable=False, unique=False)
     is_return = db.Column(db.Boolean, default=False, nullable=False, unique=False)
+    # Set on a borrow once `flask sweep-overdue` has charged its late fee, so the return does not charge it again
+    penalty_applied = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())
     date_borrowed = db.Column(
         db.DateTime, nullable=False, unique=False, default=pendulum.now
     )
@@ -74,6 +118,13 @@ class Transactions(db.Model, CRUDMixin):
 
 class UserBalance(db.Model, CRUDMixin):
     __tablename__ = "user_balance"
+    __table_args__ = (
+        # Latest entry of every member (reconcile-balances) and the member delete cascade
+        db.Index("ix_user_balance_user_entries", "user_id", db.text("date_of_entry DESC"), db.text("id DESC")),
+        # The cascade when a book delete removes its transactions
+        db.Index("ix_user_balance_transaction_id", "transaction_id"),
+        {"extend_existing": True},
+    )
 
     balance = db.Column(db.Float, nullable=False, unique=False, default=0)
     date_of_entry = db.Column(
@@ -86,3 +137,261 @@ class UserBalance(db.Model, CRUDMixin):
 
     # Relationship[s]
     user = db.relationship("User", back_populates="user_balance")
+
+
+class UserCurrentBalance(db.Model):
+    """
+    Latest user_balance entry of each user, kept up to date as the ledger is written
+    """
+
+    __tablename__ = "user_current_balance"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete='cascade'), primary_key=True)
+    user_balance_id = db.Column(
+        db.Integer, db.ForeignKey("user_balance.id", ondelete='cascade'), nullable=False, index=True
+    )
+    balance = db.Column(db.Float, nullable=False, unique=False, default=0)
+    date_of_entry = db.Column(db.DateTime, nullable=False, unique=False)
+
+
+@event.listens_for(UserBalance, "after_insert")
+def update_current_balance(mapper, connection, target: UserBalance) -> None:
+    """Moves the user's current balance to the new ledger entry within the same transaction"""
+    if target.user_id is None:
+        return
+
+    statement = insert(UserCurrentBalance).values(
+        user_id=target.user_id,
+        user_balance_id=target.id,
+        balance=target.balance,
+        date_of_entry=target.date_of_entry,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserCurrentBalance.user_id],
+        set_=dict(
+            user_balance_id=statement.excluded.user_balance_id,
+            balance=statement.excluded.balance,
+            date_of_entry=statement.excluded.date_of_entry,
+        ),
+        # Entries back-dated behind the current one must not replace it
+        where=UserCurrentBalance.date_of_entry <= statement.excluded.date_of_entry,
+    )
+
+    connection.execute(statement)
+
+
+class BalanceDailyRollup(db.Model):
+    """
+    Sum and count of the user_balance entries of each day, kept up to date as the ledger is written
+    """
+
+    __tablename__ = "balance_daily_rollup"
+
+    day = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+
+
+@event.listens_for(UserBalance, "after_insert")
+def collect_rollup_entry(mapper, connection, target: UserBalance) -> None:
+    """Adds the new ledger entry to those added to their days' rollups once the session commits"""
+    object_session(target).info.setdefault(ROLLUP_ENTRIES, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit", insert=True)
+def update_balance_rollup(session: Session) -> None:
+    """
+    Adds a committed session's ledger entries to their days' rollups, in a short transaction of its own
+
+    Within the writer's transaction, every fee charged today held the lock on today's rollup row until it committed,
+    so they all waited in line for that one row. The day is read back from the stored entries with
+    `date_of_entry::date`, as rebuild-balance-rollup and the overdue sweep do, rather than taken from the Python
+    value, whose time zone can put an entry near midnight on another day. A rollup missed by a failed update is
+    repaired by rebuild-balance-rollup.
+    """
+    entries = session.info.pop(ROLLUP_ENTRIES, None)
+
+    if not entries:
+        return
+
+    day = cast(UserBalance.date_of_entry, Date)
+    # Ordered, so that concurrent updates lock the day rows in the same order
+    days = (
+        select(day, func.sum(UserBalance.balance), func.count())
+        .where(UserBalance.id.in_(sorted(entries)))
+        .group_by(day)
+        .order_by(day)
+    )
+    statement = insert(BalanceDailyRollup).from_select(["day", "total", "entries"], days)
+    statement = statement.on_conflict_do_update(
+        index_elements=[BalanceDailyRollup.day],
+        set_=dict(
+            total=BalanceDailyRollup.total + statement.excluded.total,
+            entries=BalanceDailyRollup.entries + statement.excluded.entries,
+        ),
+    )
+
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+
+    session.info.setdefault(WRITTEN_TABLES, set()).add("balance_daily_rollup")
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_rollup_entries(session: Session) -> None:
+    session.info.pop(ROLLUP_ENTRIES, None)
+
+
+# The ledger entries of a book's transactions, which the database deletes along with the book
+CASCADED_ENTRIES = """
+    SELECT b.id, b.user_id, b.balance, b.date_of_entry
+        FROM user_balance b JOIN transactions t ON t.id = b.transaction_id
+        WHERE t.book_id = :book_id
+"""
+
+FORGET_CASCADED_ENTRIES = text(
+    f"""
+    WITH doomed AS ({CASCADED_ENTRIES}),
+    rollup AS (
+        UPDATE balance_daily_rollup r
+            SET total = r.total - d.total, entries = r.entries - d.entries
+            FROM (
+                SELECT date_of_entry::date AS day, SUM(balance) AS total, COUNT(*) AS entries
+                    FROM doomed
+                    -- Entries of the same session are only added to the rollup once it commits
+                    WHERE id <> ALL(CAST(:pending AS integer[]))
+                    GROUP BY date_of_entry::date
+            ) d
+            WHERE r.day = d.day
+    )
+    INSERT INTO user_current_balance (user_id, user_balance_id, balance, date_of_entry)
+        SELECT DISTINCT ON (b.user_id) b.user_id, b.id, b.balance, b.date_of_entry
+            FROM user_balance b
+            WHERE b.user_id IN (SELECT user_id FROM doomed) AND b.id NOT IN (SELECT id FROM doomed)
+            ORDER BY b.user_id, b.date_of_entry DESC, b.id DESC
+    ON CONFLICT (user_id) DO UPDATE
+        SET user_balance_id = EXCLUDED.user_balance_id,
+            balance = EXCLUDED.balance,
+            date_of_entry = EXCLUDED.date_of_entry
+    """
+)
+
+
+@event.listens_for(Book, "before_delete")
+def forget_cascaded_entries(mapper, connection, target: Book) -> None:
+    """
+    Takes the ledger entries a book delete cascades away out of the derived tables, within the same transaction
+
+    Their days' rollups lose them, and members whose current balance is one of them fall back to their latest entry
+    that remains, as reconcile-balances would. A member left without entries loses the current balance to the cascade.
+    """
+    pending = sorted(object_session(target).info.get(ROLLUP_ENTRIES, ()))
+    connection.execute(FORGET_CASCADED_ENTRIES, dict(book_id=target.id, pending=pending))
+    mark_written("user_balance", "user_current_balance", "balance_daily_rollup")
+
+
+class TableVersion(db.Model):
+    """
+    Per-table version number, bumped after every transaction that writes to the table commits
+    """
+
+    __tablename__ = "table_version"
+
+    table_name = db.Column(db.String(63), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+
+@tables_committed.connect
+def bump_table_versions(session: Session, tables: frozenset) -> None:
+    """
+    Bumps the version of every table a transaction wrote to, once it has committed.
+
+    In a short transaction of its own: bumped within the writer's, the version rows stayed locked until the writer
+    committed, so every write transaction to a table waited for the one before it. Until the bump lands, a conditional
+    GET may still match the previous version for a moment.
+    """
+    # Sorted, so that concurrent bumps lock the version rows in the same order
+    statement = insert(TableVersion).values([dict(table_name=table, version=1) for table in sorted(tables)])
+    statement = statement.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_=dict(version=TableVersion.version + 1, updated_at=func.now()),
+    )
+
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+
+
+class BookStatusCount(db.Model):
+    """
+    Number of books in each status, kept up to date as books are written
+    """
+
+    __tablename__ = "book_status_counts"
+
+    status = db.Column(db.String(15), primary_key=True)
+    books = db.Column(db.Integer, nullable=False, default=0)
+
+
+@event.listens_for(Session, "before_flush")
+def load_deleted_book_statuses(session: Session, flush_context, instances) -> None:
+    """Loads the status of books about to be deleted, which is no longer readable once their row is gone"""
+    for book in session.deleted:
+        if isinstance(book, Book):
+            getattr(book, "status")
+
+
+@event.listens_for(Session, "after_flush")
+def collect_book_status_changes(session: Session, flush_context) -> None:
+    """Adds the status changes of the flushed books to the deltas applied once the session commits"""
+    deltas = session.info.setdefault(BOOK_STATUS_DELTAS, Counter())
+
+    for book in session.new:
+        if isinstance(book, Book):
+            deltas[book.status] += 1
+
+    for book in session.deleted:
+        if isinstance(book, Book):
+            deltas.subtract(inspect(book).attrs.status.history.non_added())
+
+    for book in session.dirty:
+        if isinstance(book, Book):
+            history = inspect(book).attrs.status.history
+
+            if history.has_changes():
+                deltas.update(history.added)
+                deltas.subtract(history.deleted)
+
+
+# Inserted ahead of announce_written_tables, so the counters have moved before the table versions are bumped and no
+# response computed in between is cached under the new version
+@event.listens_for(Session, "after_commit", insert=True)
+def update_book_status_counts(session: Session) -> None:
+    """
+    Applies the status changes of a committed session's books to their counters, in a short transaction of its own
+
+    Within the writer's transaction, every borrow or return held the lock on its statuses' counter rows until it
+    committed, so they all waited in line for the same few rows. A counter missed by a failed update is repaired by
+    reconcile-book-statuses.
+    """
+    deltas = {status: delta for status, delta in session.info.pop(BOOK_STATUS_DELTAS, Counter()).items() if delta}
+
+    if not deltas:
+        return
+
+    # Sorted, so that a concurrent borrow and return lock the counters in the same order
+    statement = insert(BookStatusCount).values([dict(status=status, books=deltas[status]) for status in sorted(deltas)])
+    statement = statement.on_conflict_do_update(
+        index_elements=[BookStatusCount.status],
+        set_=dict(books=BookStatusCount.books + statement.excluded.books),
+    )
+
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+
+    session.info.setdefault(WRITTEN_TABLES, set()).add("book_status_counts")
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_book_status_changes(session: Session) -> None:
+    session.info.pop(BOOK_STATUS_DELTAS, None)
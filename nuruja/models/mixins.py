@@ -1,14 +1,84 @@
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from psycopg2 import errorcodes
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
 from ..extensions import db
 
+UNIT_OF_WORK = "unit_of_work"
+
+
+class RowLocked(Exception):
+    """
+    Raised by get_for_update(nowait=True) when another transaction holds the row
+    """
+
+
+class UnitOfWork(object):
+    """
+    Handle on the transaction opened by unit_of_work()
+    """
+
+    def __init__(self) -> None:
+        self.discarded = False
+
+    def discard(self) -> None:
+        """Roll back instead of committing when the unit of work ends"""
+        self.discarded = True
+
+
+def in_unit_of_work() -> bool:
+    return UNIT_OF_WORK in db.session.info
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """
+    Groups every write made inside the block into a single transaction.
+
+    CRUDMixin methods called without an explicit `commit` only flush while the block is open, and the session is
+    committed once on the way out. An exception, or a call to `discard()`, rolls everything back instead. Nested
+    blocks join the outermost one.
+    """
+    session = db.session
+
+    if in_unit_of_work():
+        yield session.info[UNIT_OF_WORK]
+        return
+
+    work = UnitOfWork()
+    session.info[UNIT_OF_WORK] = work
+
+    try:
+        yield work
+    except Exception:
+        session.rollback()
+        raise
+    else:
+        if work.discarded:
+            session.rollback()
+        else:
+            session.commit()
+    finally:
+        session.info.pop(UNIT_OF_WORK, None)
+
 
 class CRUDMixin(object):
     """
     Utility model functions
+
+    `commit` defaults to committing straight away, or to flushing when called inside a unit_of_work().
     """
 
     __table_args__ = {"extend_existing": True}
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Row version behind ETag/Last-Modified; the server default also covers rows loaded with COPY
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=func.now(), onupdate=func.now(), server_default=func.now()
+    )
 
     @classmethod
     def get_by_id(cls, id: int):
@@ -18,26 +88,50 @@ class CRUDMixin(object):
             return cls.query.get(int(id))
         return None
 
+    @classmethod
+    def get_for_update(cls, id: int, nowait: bool = False, key_share: bool = False):
+        """
+        Loads and locks a row until the end of the transaction (SELECT ... FOR UPDATE).
+
+        `nowait` fails fast with RowLocked instead of queueing behind another transaction. `key_share` takes the
+        weaker FOR NO KEY UPDATE lock, which still lets other transactions insert rows referencing this one.
+        """
+        try:
+            return cls.query.filter(cls.id == id).with_for_update(
+                nowait=nowait, key_share=key_share
+            ).populate_existing().first()
+        except OperationalError as error:
+            if getattr(error.orig, "pgcode", None) == errorcodes.LOCK_NOT_AVAILABLE:
+                raise RowLocked(f"{cls.__name__} {id} is locked by another transaction") from error
+            raise
+
     @classmethod
     def create(cls, **kwargs):
         instance = cls(**kwargs)
         return instance.save()
 
-    def save(self, commit: bool = True):
+    def save(self, commit: Optional[bool] = None):
         db.session.add(self)
 
-        if commit:
+        if commit is None and in_unit_of_work():
+            db.session.flush()
+        elif commit is not False:
             db.session.commit()
         return self
 
-    def delete(self, commit: bool = True, **kwargs):
+    def delete(self, commit: Optional[bool] = None, **kwargs):
         db.session.delete(self)
 
-        if commit:
+        if commit is None and in_unit_of_work():
+            db.session.flush()
+        elif commit is not False:
             db.session.commit()
         return self
 
-    def update(self, commit: bool = True, **kwargs):
+    def update(self, commit: Optional[bool] = None, **kwargs):
         for attr, value in kwargs.items():
             setattr(self, attr, value)
-        return commit and self.save() or self
+
+        if commit is False:
+            return self
+        return self.save(commit=commit)
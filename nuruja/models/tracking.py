@@ -0,0 +1,35 @@
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..signals import tables_committed
+
+WRITTEN_TABLES = "written_tables"
+
+
+def mark_written(*tables: str) -> None:
+    """Records writes made outside the ORM (Core statements, COPY) so they are reported like flushed ones."""
+    db.session.info.setdefault(WRITTEN_TABLES, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_written_tables(session: Session, flush_context) -> None:
+    written = session.info.setdefault(WRITTEN_TABLES, set())
+
+    for instance in chain(session.new, session.dirty, session.deleted):
+        written.add(instance.__table__.name)
+
+
+@event.listens_for(Session, "after_commit")
+def announce_written_tables(session: Session) -> None:
+    written = session.info.pop(WRITTEN_TABLES, None)
+
+    if written:
+        tables_committed.send(session, tables=frozenset(written))
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_written_tables(session: Session) -> None:
+    session.info.pop(WRITTEN_TABLES, None)
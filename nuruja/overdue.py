@@ -0,0 +1,146 @@
+"""
+Late fees charged in bulk, as loans fall overdue, instead of one at a time when the book comes back.
+
+`charge_overdue_loans` walks the open loans past their due date in batches. Each batch locks its members and books
+the way a desk does (members first, skipping any another desk is holding) and charges them in one statement: the
+loans are marked `penalty_applied`, every member gets one ledger entry for all their late fees, and the current
+balances and the daily rollup are moved along with it. Charged loans are never charged again, so running it twice, or
+in a loop, is safe, and a return of a swept loan only takes the rent off the balance.
+"""
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import Select, bindparam, false, select, text, true
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import Integer
+
+from .extensions import db
+from .models import Book, Transactions, User
+from .models.tracking import mark_written
+
+# Loans whose user and book were locked, re-checked now that no desk can touch them: the book's latest transaction is
+# still this borrow, overdue and uncharged
+CHARGE_PENALTIES = text(
+    """
+    WITH charged AS (
+        UPDATE transactions t
+            SET penalty_applied = TRUE, updated_at = now()
+            FROM book b
+            WHERE t.id = ANY(:loan_ids) AND b.id = t.book_id AND b.status = 'rented'
+                AND NOT t.is_return AND NOT t.penalty_applied AND t.date_due < :now
+                AND NOT EXISTS (
+                    SELECT 1 FROM transactions r
+                        WHERE r.book_id = t.book_id AND (r.date_borrowed, r.id) > (t.date_borrowed, t.id)
+                )
+            RETURNING t.user_id, b.late_penalty_fee AS fee
+    ),
+    fees AS (
+        SELECT user_id, SUM(fee) AS fees FROM charged GROUP BY user_id
+    ),
+    entries AS (
+        INSERT INTO user_balance (user_id, balance, date_of_entry)
+            SELECT f.user_id, COALESCE(c.balance, 0) + f.fees, :now
+                FROM fees f LEFT JOIN user_current_balance c ON c.user_id = f.user_id
+                ORDER BY f.user_id
+            RETURNING id, user_id, balance, date_of_entry
+    ),
+    current_balances AS (
+        INSERT INTO user_current_balance (user_id, user_balance_id, balance, date_of_entry)
+            SELECT user_id, id, balance, date_of_entry FROM entries
+        ON CONFLICT (user_id) DO UPDATE
+            SET user_balance_id = EXCLUDED.user_balance_id,
+                balance = EXCLUDED.balance,
+                date_of_entry = EXCLUDED.date_of_entry
+            WHERE user_current_balance.date_of_entry <= EXCLUDED.date_of_entry
+    ),
+    rollup AS (
+        INSERT INTO balance_daily_rollup (day, total, entries)
+            SELECT date_of_entry::date, SUM(balance), COUNT(*) FROM entries GROUP BY date_of_entry::date
+        ON CONFLICT (day) DO UPDATE
+            SET total = balance_daily_rollup.total + EXCLUDED.total,
+                entries = balance_daily_rollup.entries + EXCLUDED.entries
+    )
+    SELECT COUNT(*) AS loans, COUNT(DISTINCT user_id) AS members, COALESCE(SUM(fee), 0) AS fees FROM charged
+    """
+).bindparams(bindparam("loan_ids", type_=ARRAY(Integer)))
+
+
+class SweepReport(NamedTuple):
+    loans: int = 0
+    members: int = 0
+    fees: int = 0
+
+    def __add__(self, other: "SweepReport") -> "SweepReport":
+        return SweepReport(*(mine + theirs for mine, theirs in zip(self, other)))
+
+
+def overdue_loans_statement(now: datetime, after: int, batch_size: int) -> Select:
+    """
+    The next `batch_size` uncharged overdue loans past loan id `after`.
+
+    Driven from the rented books (ix_book_status_id) and the latest transaction of each (ix_transactions_book_history),
+    so the whole borrowing history is never read.
+    """
+    transactions = Transactions.__table__
+    latest = (
+        select(transactions.c.id, transactions.c.user_id, transactions.c.is_return, transactions.c.penalty_applied,
+               transactions.c.date_due)
+        .where(transactions.c.book_id == Book.id)
+        .order_by(transactions.c.date_borrowed.desc(), transactions.c.id.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+
+    return (
+        select(latest.c.id, latest.c.user_id, Book.id.label("book_id"))
+        .select_from(Book)
+        .join(latest, true())
+        .where(Book.status == "rented", latest.c.is_return == false(), latest.c.penalty_applied == false(),
+               latest.c.date_due < now, latest.c.id > after)
+        .order_by(latest.c.id)
+        .limit(batch_size)
+    )
+
+
+def lock_ids(model, ids: set[int]) -> set[int]:
+    """Locks whichever of the rows no other transaction is holding, in id order like the desks"""
+    locked = db.session.execute(
+        select(model.id).where(model.id.in_(sorted(ids))).order_by(model.id).with_for_update(
+            key_share=True, skip_locked=True
+        )
+    ).scalars()
+
+    return set(locked)
+
+
+def charge_batch(now: datetime, loans: list) -> SweepReport:
+    members = lock_ids(User, {loan.user_id for loan in loans})
+    books = lock_ids(Book, {loan.book_id for loan in loans if loan.user_id in members})
+    loan_ids = [loan.id for loan in loans if loan.user_id in members and loan.book_id in books]
+
+    if not loan_ids:
+        return SweepReport()
+
+    report = SweepReport(*db.session.execute(CHARGE_PENALTIES, dict(loan_ids=loan_ids, now=now)).one())
+
+    if report.loans:
+        # Written past the ORM listeners, which keep the derived tables up to date, so they were updated above
+        mark_written("transactions", "user_balance", "user_current_balance", "balance_daily_rollup")
+
+    return report
+
+
+def charge_overdue_loans(now: datetime, batch_size: int = 1000) -> SweepReport:
+    """
+    Charges the late fee of every open loan due before `now`, committing after each batch.
+
+    Loans whose member or book is busy at a desk are left for the next sweep.
+    """
+    report, after = SweepReport(), 0
+
+    while loans := db.session.execute(overdue_loans_statement(now, after, batch_size)).all():
+        after = loans[-1].id
+        report += charge_batch(now, loans)
+        db.session.commit()
+
+    return report
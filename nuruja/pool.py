@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from uuid import uuid4
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from configs import configs
+
+# Pool size of the processes gunicorn.conf.py does not size it for: the commands, the tests and uvicorn
+DEFAULT_POOL_SIZE = 5
+
+
+class CheckoutTiming:
+    """
+    Pool mixin recording how long checkouts wait for a connection, and how many give up after `pool_timeout`.
+
+    The counters are per pool, and so per worker process: every worker reports its own.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.timing_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.longest_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+
+            with self.timing_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.total_wait += waited
+                self.longest_wait = max(self.longest_wait, waited)
+
+    def statistics(self) -> dict:
+        with self.timing_lock:
+            return dict(
+                size=self.size(),
+                checked_out=self.checkedout(),
+                idle=self.checkedin(),
+                overflow=max(self.overflow(), 0),
+                max_overflow=self._max_overflow,
+                checkouts=self.checkouts,
+                timeouts=self.timeouts,
+                average_wait_ms=round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                longest_wait_ms=round(self.longest_wait * 1000, 3),
+            )
+
+
+class TimedQueuePool(CheckoutTiming, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(CheckoutTiming, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(asynchronous: bool = False) -> dict:
+    """
+    Engine keyword arguments for the configured pool, for the psycopg2 driver or (`asynchronous`) asyncpg.
+
+    The statement timeout is normally a server setting of every new connection. PgBouncer in transaction mode does
+    not pass startup settings through and hands a different server connection to every transaction, so with
+    `PGBOUNCER` the timeout is set per transaction instead (see `set_statement_timeout`), and asyncpg is kept from
+    preparing named statements that could end up on another server connection.
+    """
+    options = dict(
+        poolclass=TimedAsyncQueuePool if asynchronous else TimedQueuePool,
+        pool_size=configs.ASYNC_POOL_SIZE if asynchronous else (configs.POOL_SIZE or DEFAULT_POOL_SIZE),
+        max_overflow=configs.ASYNC_MAX_OVERFLOW if asynchronous else configs.POOL_MAX_OVERFLOW,
+        pool_timeout=configs.POOL_TIMEOUT,
+        pool_recycle=configs.POOL_RECYCLE,
+        pool_pre_ping=configs.POOL_PRE_PING,
+    )
+    connect_args = {}
+
+    if configs.STATEMENT_TIMEOUT and not configs.PGBOUNCER:
+        if asynchronous:
+            connect_args["server_settings"] = {"statement_timeout": str(configs.STATEMENT_TIMEOUT)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={configs.STATEMENT_TIMEOUT}"
+
+    if configs.PGBOUNCER and asynchronous:
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+    if connect_args:
+        options["connect_args"] = connect_args
+
+    return options
+
+
+@event.listens_for(Engine, "begin")
+def set_statement_timeout(connection: Connection) -> None:
+    """Applies the statement timeout to every transaction when it cannot be a setting of the connection"""
+    if configs.PGBOUNCER and configs.STATEMENT_TIMEOUT:
+        # Straight through the DBAPI cursor, which opens the transaction the setting is local to
+        cursor = connection.connection.cursor()
+        cursor.execute(f"SET LOCAL statement_timeout = {int(configs.STATEMENT_TIMEOUT)}")
+        cursor.close()
+
+
+def dispose_inherited_pools(app) -> None:
+    """
+    Forgets the pooled connections a forked worker inherited along with a preloaded application.
+
+    The sockets belong to the parent process, so they are dropped without being closed, which would end the parent's
+    sessions; the worker opens its own connections as it needs them.
+    """
+    with app.app_context():
+        engines = [*app.extensions["sqlalchemy"].engines.values(), *app.extensions["replicas"].engines.values()]
+
+    for engine in engines:
+        engine.dispose(close=False)
+
+
+def pool_statistics(**engines: Engine) -> dict:
+    """Occupancy and checkout waits of the given engines' pools in this worker process"""
+    return dict(
+        pid=os.getpid(),
+        pools={name: engine.pool.statistics() for name, engine in engines.items()
+               if isinstance(engine.pool, CheckoutTiming)},
+    )
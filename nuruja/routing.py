@@ -0,0 +1,175 @@
+"""
+Read replicas for GET traffic.
+
+With `REPLICA_DSNS` configured, `RoutingSession` sends the statements of GET and HEAD requests to a replica, taking
+them in turn, and everything else (writes, flushes, CLI commands) to the primary. Each request sticks to the replica it
+started on. A replica that cannot be reached, or replays the primary's changes more than `REPLICA_MAX_LAG` seconds
+behind, is skipped until a later check finds it healthy; with none left, reads go to the primary. A client that has
+just written is pinned to the primary for `REPLICA_PIN_SECONDS` by a cookie, so it reads its own writes. Responses
+computed for the shared cache are read from the primary too (`read_from_primary`).
+"""
+import itertools
+import math
+import threading
+import time
+from typing import Optional
+
+from flask import Flask, current_app, has_request_context, request
+from flask.wrappers import Response
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import Engine
+
+from .pool import engine_options
+from .signals import tables_committed
+
+READ_METHODS = frozenset({"GET", "HEAD"})
+PIN_COOKIE = "nuruja_primary"
+# Per request, in the WSGI environ: the engine picked for the request's reads, and whether it wrote
+REPLICA_KEY = "nuruja.replica"
+WROTE_KEY = "nuruja.wrote"
+# Seconds to wait for a replica connection, so a dead host fails its health check quickly
+CONNECT_TIMEOUT = 2
+
+# Seconds of replay lag; none while the replica has replayed everything it received, or when it is not a standby
+REPLICATION_LAG = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+class Replica(object):
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        self.checked = -math.inf
+        self.checking = threading.Lock()
+
+
+class ReadReplicas(object):
+    """
+    The replicas of a worker and their health, checked at most every `check_interval` seconds.
+
+    Checks run inline, in whichever request finds the last one out of date; requests arriving meanwhile go by the
+    previous result rather than wait for it.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        self.replicas: list[Replica] = []
+        self.turns = itertools.count()
+        self.max_lag = 5.0
+        self.pin_seconds = 5
+        self.check_interval = 10.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.max_lag = app.config.setdefault("REPLICA_MAX_LAG", self.max_lag)
+        self.pin_seconds = app.config.setdefault("REPLICA_PIN_SECONDS", self.pin_seconds)
+        self.check_interval = app.config.setdefault("REPLICA_CHECK_INTERVAL", self.check_interval)
+        self.replicas = [Replica(self.create_engine(str(dsn))) for dsn in app.config.setdefault("REPLICA_DSNS", [])]
+
+        app.extensions["replicas"] = self
+        app.after_request(self.pin_after_write)
+        tables_committed.connect(self.on_tables_committed, weak=False)
+
+    @staticmethod
+    def create_engine(dsn: str) -> Engine:
+        options = engine_options()
+        options["connect_args"] = {**options.get("connect_args", {}), "connect_timeout": CONNECT_TIMEOUT}
+
+        return create_engine(dsn, **options)
+
+    @property
+    def engines(self) -> dict[str, Engine]:
+        return {f"replica_{number}": replica.engine for number, replica in enumerate(self.replicas)}
+
+    def dispose(self) -> None:
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    def check(self, replica: Replica) -> None:
+        try:
+            with replica.engine.connect() as connection:
+                lag = connection.execute(REPLICATION_LAG).scalar()
+        except exc.SQLAlchemyError:
+            replica.healthy = False
+        else:
+            replica.healthy = True
+            # No replay timestamp yet on a standby that is behind: it cannot say how far
+            replica.lag = math.inf if lag is None else float(lag)
+
+        replica.checked = time.monotonic()
+
+    def available(self, replica: Replica) -> bool:
+        if time.monotonic() - replica.checked >= self.check_interval and replica.checking.acquire(blocking=False):
+            try:
+                self.check(replica)
+            finally:
+                replica.checking.release()
+
+        return replica.healthy and replica.lag <= self.max_lag
+
+    def choose(self) -> Optional[Engine]:
+        """The next available replica in turn, or None for the primary"""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self.turns) % len(self.replicas)]
+
+            if self.available(replica):
+                return replica.engine
+
+        return None
+
+    def pinned(self) -> bool:
+        try:
+            return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def for_request(self) -> Optional[Engine]:
+        """The replica serving the current request's reads, or None when they must go to the primary"""
+        if not self.replicas or request.method not in READ_METHODS:
+            return None
+
+        if REPLICA_KEY not in request.environ:
+            request.environ[REPLICA_KEY] = None if self.pinned() else self.choose()
+
+        return request.environ[REPLICA_KEY]
+
+    def on_tables_committed(self, sender, tables: frozenset) -> None:
+        if has_request_context():
+            request.environ[WROTE_KEY] = True
+
+    def pin_after_write(self, response: Response) -> Response:
+        if self.replicas and request.environ.get(WROTE_KEY):
+            # The expiry goes in the value too, for clients that keep cookies past their max age
+            response.set_cookie(PIN_COOKIE, str(time.time() + self.pin_seconds), max_age=self.pin_seconds,
+                                httponly=True, samesite="Lax")
+
+        return response
+
+
+def read_from_primary() -> None:
+    """Sends the rest of the current request's reads to the primary, whatever replica it started on"""
+    if has_request_context():
+        request.environ[REPLICA_KEY] = None
+
+
+class RoutingSession(Session):
+    """db.session, with the reads of GET requests sent to a replica when there is one"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, "is_dml", False) and has_request_context():
+            replicas: Optional[ReadReplicas] = current_app.extensions.get("replicas")
+            replica = replicas.for_request() if replicas else None
+
+            if replica is not None:
+                return replica
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,112 @@
+"""
+Response serialization without a pydantic model per row.
+
+`OrjsonProvider` is the application's JSON provider. It encodes with orjson but keeps Flask's output (sorted keys,
+compact unless debugging, dates as HTTP dates), except that non-ASCII text is written as UTF-8 rather than \\u escapes:
+the same JSON, though not the same bytes. `dumps` calls with arguments orjson has no option for (`separators`,
+`ensure_ascii`, ...) are left to Flask's provider. `serialize_rows` turns Core result rows straight into the dicts a
+response schema's `.dict()` would give, with a plan compiled once per schema and row shape. Pydantic is left to
+validate requests.
+"""
+import functools
+from typing import Callable, Optional, Sequence, Type
+
+import orjson
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+from pydantic import BaseModel
+from sqlalchemy import Column
+from sqlalchemy.engine import Row
+
+# Field types a schema would coerce a database value to, e.g. balances stored as floats but served as ints
+COERCED = (int, float, str, bool)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def option(self, indent: bool = False) -> int:
+        # Dates are handed back to `default`, which formats them as HTTP dates like the default provider
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        return option
+
+    def encode(self, obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self.option(indent))
+
+    def dumps(self, obj, **kwargs) -> str:
+        indent = kwargs.pop("indent", None)
+
+        if kwargs or indent not in (None, 2):
+            return super().dumps(obj, indent=indent, **kwargs)
+
+        return self.encode(obj, indent=indent == 2).decode()
+
+    def loads(self, s: str | bytes, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        return self._app.response_class(self.encode(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def schema_columns(model, schema: Type[BaseModel], fields: Optional[Sequence[str]] = None) -> list[Column]:
+    """The columns of `model` a response schema is made of, or just its `fields`, to select nothing more"""
+    return [model.__table__.c[name] for name in fields or schema.__fields__]
+
+
+def row_serializer(schema: Type[BaseModel], fields: tuple[str, ...],
+                   only: Optional[tuple[str, ...]] = None) -> Callable[[Sequence], dict]:
+    """
+    A function from rows with `fields` to the schema's fields, or `only` some of them, coerced to its field types
+    where they differ
+    """
+    unknown = [name for name in only or () if name not in schema.__fields__]
+
+    if unknown:
+        raise ValueError(f"Unknown field[s]: {', '.join(unknown)}")
+
+    # In the schema's order, so every ordering of the same sparse fieldset shares one plan
+    if only:
+        only = tuple(name for name in schema.__fields__ if name in only)
+
+    return compiled_serializer(schema, fields, only)
+
+
+@functools.lru_cache(maxsize=256)
+def compiled_serializer(schema: Type[BaseModel], fields: tuple[str, ...],
+                        only: Optional[tuple[str, ...]]) -> Callable[[Sequence], dict]:
+    plan = [
+        (name, fields.index(name), field.type_ if field.type_ in COERCED else None)
+        for name, field in ((name, schema.__fields__[name]) for name in only or schema.__fields__)
+    ]
+
+    def serialize(row: Sequence) -> dict:
+        record = {}
+
+        for name, position, coerce in plan:
+            value = row[position]
+
+            if coerce is not None and value is not None and type(value) is not coerce:
+                value = coerce(value)
+
+            record[name] = value
+
+        return record
+
+    return serialize
+
+
+def serialize_rows(schema: Type[BaseModel], rows: Sequence[Row], only: Optional[tuple[str, ...]] = None) -> list[dict]:
+    if not rows:
+        return []
+
+    serialize = row_serializer(schema, tuple(rows[0]._fields), only)
+
+    return [serialize(row) for row in rows]
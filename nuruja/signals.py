@@ -0,0 +1,6 @@
+from blinker import Namespace
+
+signals = Namespace()
+
+# Sent after a commit with the names of the tables the transaction wrote to
+tables_committed = signals.signal("tables-committed")
@@ -0,0 +1,233 @@
+"""
+Deterministic synthetic data for benchmarking at production scale (`flask seed`).
+
+The catalog and the membership are cut into `PARTITIONS` slices. Every partition is generated from its own seeded
+Faker and random.Random, and written with COPY in its own transaction by one of several worker processes. Members
+only borrow books from their own partition, so the partitions are independent of each other, and ids are derived
+from the position of a row rather than handed out by sequences. The same seed, sizes and end date therefore always
+give the same rows, whatever the number of processes.
+"""
+import random
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from typing import NamedTuple
+
+from faker import Faker
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from .bulk import copy_rows
+from .controllers.transactions import BALANCE_CUT_OFF
+from .extensions import db
+
+PARTITIONS = 64
+
+LOAN_DAYS = 14
+
+# Share of returns that come back after the due date, and of returns after which the member settles their balance
+LATE_RETURN_RATE = 0.15
+CLEAR_RATE = 0.1
+
+RENT_FEES = [50, 100, 150, 200]
+LATE_PENALTY_FEES = [10, 25, 50]
+
+TABLES = ["book", "user", "transactions", "user_balance"]
+
+
+class SeedPlan(NamedTuple):
+    """Everything a worker needs to generate one partition, identically in any process"""
+
+    uri: str
+    seed: int
+    partition: int
+    partitions: int
+    books: int
+    members: int
+    loans: int
+    start: datetime
+    until: datetime
+    book_offset: int
+    member_offset: int
+    transaction_offset: int
+    balance_offset: int
+
+
+def max_loans(loans: int) -> int:
+    """Most loans a member can have, which fixes how many transaction and ledger ids each member is given"""
+    return 4 * loans + 4
+
+
+def partition_range(total: int, partitions: int, partition: int) -> range:
+    return range(total * partition // partitions, total * (partition + 1) // partitions)
+
+
+def member_loans(rng: random.Random, loans: int, start: datetime, until: datetime) -> list[tuple[datetime, datetime]]:
+    """Borrow and return times of one member's loans, one after the other. A return after `until` is still out."""
+    joined = start + (until - start) * rng.random() * 0.9
+    mean_gap = (until - joined) / (loans + 1)
+    borrowed = joined
+    windows = []
+
+    while len(windows) < max_loans(loans):
+        borrowed += mean_gap * rng.expovariate(1)
+
+        if borrowed >= until:
+            break
+
+        if rng.random() < LATE_RETURN_RATE:
+            kept = timedelta(days=rng.uniform(LOAN_DAYS + 1, LOAN_DAYS * 3))
+        else:
+            kept = timedelta(days=rng.uniform(0.5, LOAN_DAYS))
+
+        windows.append((borrowed, borrowed + kept))
+        borrowed += kept
+
+    return windows
+
+
+def assign_books(rng: random.Random, windows: list[tuple[int, datetime, datetime]], books: range) -> dict:
+    """
+    Gives each loan a book that is on the shelf for its whole duration, going through the loans in order of borrowing.
+
+    Loans for which a few random picks find no free book are dropped. Returns {(member, borrowed): book id}.
+    """
+    free_from = {book_id: datetime.min for book_id in books}
+    assigned = {}
+
+    for member, borrowed, returned in sorted(windows, key=lambda window: window[1]):
+        for _ in range(5):
+            book_id = rng.choice(books)
+
+            if free_from[book_id] <= borrowed:
+                free_from[book_id] = returned
+                assigned[member, borrowed] = book_id
+                break
+
+    return assigned
+
+
+def seed_partition(plan: SeedPlan) -> tuple[int, int, int, int]:
+    """Generates one partition and COPYs it in, returning the number of books, members, transactions and entries"""
+    rng = random.Random(f"{plan.seed}:{plan.partition}")
+    fake = Faker()
+    fake.seed_instance(plan.seed * PARTITIONS + plan.partition)
+
+    book_indexes = partition_range(plan.books, plan.partitions, plan.partition)
+    book_ids = range(plan.book_offset + book_indexes.start + 1, plan.book_offset + book_indexes.stop + 1)
+    member_indexes = partition_range(plan.members, plan.partitions, plan.partition)
+
+    fees = {book_id: (rng.choice(RENT_FEES), rng.choice(LATE_PENALTY_FEES)) for book_id in book_ids}
+    windows = [
+        (index, borrowed, returned)
+        for index in member_indexes
+        for borrowed, returned in member_loans(rng, plan.loans, plan.start, plan.until)
+    ]
+    assigned = assign_books(rng, windows, book_ids)
+
+    members, transactions, entries = [], [], []
+    rented = set()
+    loans_by_member = {}
+
+    for index, borrowed, returned in windows:
+        if (index, borrowed) in assigned:
+            loans_by_member.setdefault(index, []).append((borrowed, returned, assigned[index, borrowed]))
+
+    for index in member_indexes:
+        member_id = plan.member_offset + index + 1
+        name = fake.user_name()
+        username = f"{name[:19 - len(str(member_id))]}_{member_id}"
+        members.append((member_id, username, f"{username}@{fake.free_email_domain()}", f"07{member_id:08d}",
+                        fake.address().replace("\n", ", ")[:100], False))
+
+        transaction_id = plan.transaction_offset + index * 2 * max_loans(plan.loans)
+        balance_id = plan.balance_offset + index * 3 * max_loans(plan.loans)
+        balance = 0
+
+        # Ledger entries follow the desk: rent is added on borrowing and taken off on return, plus any late penalty
+        for borrowed, returned, book_id in loans_by_member.get(index, []):
+            rent_fee, late_penalty_fee = fees[book_id]
+            due = borrowed + timedelta(days=LOAN_DAYS)
+
+            if balance + rent_fee > BALANCE_CUT_OFF:
+                balance_id += 1
+                balance = 0
+                entries.append((balance_id, balance, borrowed - timedelta(minutes=5), member_id, None))
+
+            transaction_id += 1
+            balance_id += 1
+            balance += rent_fee
+            transactions.append((transaction_id, rent_fee, False, borrowed, due, member_id, book_id))
+            entries.append((balance_id, balance, borrowed, member_id, transaction_id))
+
+            if returned > plan.until:
+                rented.add(book_id)
+                continue
+
+            penalty = late_penalty_fee if returned > due else 0
+            transaction_id += 1
+            balance_id += 1
+            balance += penalty - rent_fee
+            transactions.append((transaction_id, penalty, True, borrowed, returned, member_id, book_id))
+            entries.append((balance_id, balance, returned, member_id, transaction_id))
+
+            if rng.random() < CLEAR_RATE:
+                balance_id += 1
+                balance = 0
+                entries.append((balance_id, balance, returned + timedelta(minutes=5), member_id, None))
+
+    books = [
+        (book_id, fake.catch_phrase()[:100], fake.name()[:120], f"978{book_id:010d}",
+         fake.date_time_between(datetime(1950, 1, 1), plan.start), "rented" if book_id in rented else "not-rented",
+         *fees[book_id])
+        for book_id in book_ids
+    ]
+
+    engine = create_engine(plan.uri, poolclass=NullPool)
+
+    with engine.begin() as connection:
+        copy_rows(connection, "book", ["id", "title", "author", "isbn", "date_of_publication", "status", "rent_fee",
+                                       "late_penalty_fee"], books)
+        copy_rows(connection, '"user"', ["id", "username", "email", "phone_number", "address", "is_admin"], members)
+        copy_rows(connection, "transactions", ["id", "rent_fee", "is_return", "date_borrowed", "date_due", "user_id",
+                                               "book_id"], transactions)
+        copy_rows(connection, "user_balance", ["id", "balance", "date_of_entry", "user_id", "transaction_id"], entries)
+
+    engine.dispose()
+
+    return len(books), len(members), len(transactions), len(entries)
+
+
+def seed_database(uri: str, books: int, members: int, loans: int, seed: int, days: int, until: datetime,
+                  processes: int) -> tuple[int, int, int, int]:
+    """
+    Adds `books` books and `members` members with about `loans` loans each over the `days` before `until`.
+
+    Rows go after whatever the tables already hold; the id sequences are moved past them at the end. Returns the
+    number of books, members, transactions and ledger entries written.
+    """
+    offsets = {
+        table: db.session.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM "{table}"')).scalar() for table in TABLES
+    }
+    db.session.commit()
+
+    partitions = max(1, min(PARTITIONS, books, members))
+    plans = [
+        SeedPlan(uri, seed, partition, partitions, books, members, loans, until - timedelta(days=days), until,
+                 offsets["book"], offsets["user"], offsets["transactions"], offsets["user_balance"])
+        for partition in range(partitions)
+    ]
+
+    # Spawned rather than forked, so no worker inherits the connections of this process
+    with get_context("spawn").Pool(processes) as pool:
+        totals = [sum(counts) for counts in zip(*pool.imap_unordered(seed_partition, plans))]
+
+    for table in TABLES:
+        db.session.execute(
+            text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                 f"GREATEST((SELECT MAX(id) FROM \"{table}\"), 1))")
+        )
+        db.session.execute(text(f'ANALYZE "{table}"'))
+
+    db.session.commit()
+
+    return tuple(totals)
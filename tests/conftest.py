@@ -7,6 +7,7 @@ from sqlalchemy_utils import database_exists, create_database, drop_database
 
 from configs import configs
 from ..nuruja import create_app, db
+from ..nuruja.extensions import cache
 from ..nuruja.models import User, Book
 
 engine = create_engine(configs.POSTGRES_DSN)
@@ -20,7 +21,9 @@ def create_test_database(db_engine=engine) -> None:
 
 @pytest.fixture()
 def app(create_test_database) -> Flask:
-    yield create_app()
+    app = create_app()
+    cache.clear()
+    yield app
 
 
 @pytest.fixture()
@@ -0,0 +1,32 @@
+import os
+from http import HTTPStatus
+
+from flask.testing import FlaskClient
+
+
+def test_pool_statistics(client_app: FlaskClient) -> None:
+    with client_app as test_client:
+        test_client.get("/books")
+        response = test_client.get("/admin/pool")
+
+    pool = response.json["pools"]["sync"]
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["pid"] == os.getpid()
+    assert pool["checkouts"] >= 1
+    assert pool["timeouts"] == 0
+    assert pool["checked_out"] + pool["idle"] >= 1
+
+
+def test_metrics(client_app: FlaskClient) -> None:
+    with client_app as test_client:
+        test_client.get("/books")
+        response = test_client.get("/metrics")
+
+    exposition = response.get_data(as_text=True)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "text/plain"
+    assert ('nuruja_request_duration_seconds_count{endpoint="books.get_all_books",method="GET",status="404"}'
+            in exposition)
+    assert 'nuruja_request_sql_statements_sum{endpoint="books.get_all_books",method="GET"}' in exposition
@@ -0,0 +1,102 @@
+from http import HTTPStatus
+
+import pendulum
+from flask import Flask
+from flask.testing import FlaskClient
+
+from ..nuruja.controllers.schemas import BorrowBookSchema
+from ..nuruja.extensions import db
+from ..nuruja.models import BalanceDailyRollup, Book, BookStatusCount, User, UserBalance
+
+
+def test_book_status_is_cached(client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+
+        first = test_client.get("/analytics/book-status")
+        second = test_client.get("/analytics/book-status")
+        statistics = test_client.get("/analytics/cache")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json == first.json == dict(data=[dict(id="not-rented", label="not-rented", value=1)])
+    assert statistics.json["hits"] == 1
+    assert statistics.json["misses"] == 1
+
+
+def test_borrow_invalidates_cached_analytics(client_app: FlaskClient, fake_user: User,
+                                             fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+
+        test_client.get("/analytics/book-status")
+        test_client.post(f"/members/{fake_user.id}/borrow",
+                         json=BorrowBookSchema(book_id=fake_available_book.id).dict())
+        after_borrow = test_client.get("/analytics/book-status")
+
+    # Served stale while it is recomputed in the background
+    assert after_borrow.status_code == HTTPStatus.OK
+    assert after_borrow.headers["X-Cache"] == "STALE"
+
+
+def test_balance_series_granularity(client_app: FlaskClient, fake_user: User) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        UserBalance.create(user_id=fake_user.id, balance=100, date_of_entry=pendulum.datetime(2023, 3, 6, 9))
+        UserBalance.create(user_id=fake_user.id, balance=50, date_of_entry=pendulum.datetime(2023, 3, 6, 17))
+        UserBalance.create(user_id=fake_user.id, balance=25, date_of_entry=pendulum.datetime(2023, 3, 8, 12))
+        UserBalance.create(user_id=fake_user.id, balance=10, date_of_entry=pendulum.datetime(2023, 4, 3, 12))
+
+        daily = test_client.get("/analytics/balances-series?from=2023-03-01&to=2023-03-31")
+        weekly = test_client.get("/analytics/balances-series?granularity=week")
+
+    assert daily.status_code == HTTPStatus.OK
+    assert [point["y"] for point in daily.json["data"]] == [150, 25]
+    assert weekly.status_code == HTTPStatus.OK
+    assert [point["y"] for point in weekly.json["data"]] == [175, 10]
+
+
+def test_rebuild_balance_rollup(app: Flask, client_app: FlaskClient, fake_user: User) -> None:
+    with client_app:
+        fake_user.save()
+        UserBalance.create(user_id=fake_user.id, balance=100, date_of_entry=pendulum.datetime(2023, 3, 6, 9))
+        # Just past midnight here, but still the day before in most database time zones
+        UserBalance.create(user_id=fake_user.id, balance=30,
+                           date_of_entry=pendulum.datetime(2023, 3, 8, 0, 30, tz="Pacific/Auckland"))
+        incremental = {row.day: (row.total, row.entries) for row in BalanceDailyRollup.query.all()}
+
+        result = app.test_cli_runner().invoke(args=["rebuild-balance-rollup"])
+        rebuilt = {row.day: (row.total, row.entries) for row in BalanceDailyRollup.query.populate_existing().all()}
+
+    assert result.exit_code == 0
+    assert rebuilt == incremental
+    assert incremental[pendulum.date(2023, 3, 6)] == (100, 1)
+
+
+def test_book_status_counts_follow_borrow_and_delete(client_app: FlaskClient, fake_user: User,
+                                                     fake_available_book: Book, fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        test_client.post(f"/members/{fake_user.id}/borrow",
+                         json=BorrowBookSchema(book_id=fake_available_book.id).dict())
+        test_client.delete(f"/books/{fake_unavailable_book.id}/delete")
+        counts = {row.status: row.books for row in BookStatusCount.query.populate_existing().all()}
+
+    assert counts == {"not-rented": 0, "rented": 1}
+
+
+def test_reconcile_book_statuses(app: Flask, client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app:
+        fake_available_book.save()
+        BookStatusCount.query.filter(BookStatusCount.status == "not-rented").update(dict(books=7))
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=["reconcile-book-statuses"])
+        counts = {row.status: row.books for row in BookStatusCount.query.populate_existing().all()}
+
+    assert result.exit_code == 0
+    assert counts == {"not-rented": 1}
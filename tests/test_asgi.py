@@ -0,0 +1,59 @@
+from http import HTTPStatus
+
+import pytest
+from flask.testing import FlaskClient
+
+from ..nuruja.models import Book, User
+
+pytest.importorskip("starlette")
+pytest.importorskip("asyncpg")
+
+from starlette.testclient import TestClient  # noqa: E402
+
+from ..nuruja.aio import create_asgi_app  # noqa: E402
+
+
+def test_async_views_answer_like_flask(client_app: FlaskClient, fake_user: User, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+        paths = ["/books?limit=1", f"/books/{fake_available_book.id}", "/books/available", "/books/999",
+                 "/members", f"/members/{fake_user.id}", "/analytics/book-status", "/books?after=not-a-cursor"]
+
+        with TestClient(create_asgi_app()) as async_client:
+            for path in paths:
+                expected = test_client.get(path, headers={"Accept": "application/json"})
+                response = async_client.get(path, headers={"Accept": "application/json"})
+
+                assert response.status_code == expected.status_code, path
+                assert response.content == expected.data, path
+                assert response.headers.get("ETag") == expected.headers.get("ETag"), path
+
+
+def test_async_views_revalidate_and_fall_back_to_flask(client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app:
+        fake_available_book.save()
+
+        with TestClient(create_asgi_app()) as async_client:
+            response = async_client.get(f"/books/{fake_available_book.id}")
+            revalidated = async_client.get(f"/books/{fake_available_book.id}",
+                                           headers={"If-None-Match": response.headers["ETag"]})
+            deleted = async_client.delete(f"/books/{fake_available_book.id}/delete")
+            exported = async_client.get("/books?format=ndjson")
+
+    assert revalidated.status_code == HTTPStatus.NOT_MODIFIED
+    assert deleted.status_code == HTTPStatus.ACCEPTED
+    assert exported.headers["Content-Type"] == "application/x-ndjson"
+
+
+def test_async_mode_serves_analytics_from_the_cache(client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app:
+        fake_available_book.save()
+
+        with TestClient(create_asgi_app()) as async_client:
+            first = async_client.get("/analytics/book-status")
+            second = async_client.get("/analytics/book-status")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
@@ -1,8 +1,13 @@
+import json
 from http import HTTPStatus
 
+import pendulum
+from flask import Flask
 from flask.testing import FlaskClient
 
-from ..nuruja.models import Book
+from ..nuruja import db
+from ..nuruja.controllers.schemas import BorrowBookSchema
+from ..nuruja.models import BalanceDailyRollup, Book, User, UserBalance, UserCurrentBalance
 
 
 def test_add_a_book(client_app: FlaskClient, fake_available_book: Book) -> None:
@@ -44,6 +49,29 @@ def test_remove_book(client_app: FlaskClient, fake_available_book: Book) -> None
     assert response.json == dict(details="Book deleted successfully")
 
 
+def test_remove_rented_book_keeps_balances_consistent(app: Flask, client_app: FlaskClient, fake_user: User,
+                                                      fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+        UserBalance.create(user_id=fake_user.id, balance=40, date_of_entry=pendulum.yesterday())
+        test_client.post(f"/members/{fake_user.id}/borrow",
+                         json=BorrowBookSchema(book_id=fake_available_book.id).dict())
+
+        # The borrow's ledger entry goes with the book
+        test_client.delete(f"/books/{fake_available_book.id}/delete")
+        db.session.expire_all()
+        current = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == fake_user.id).one()
+        incremental = {row.day: (row.total, row.entries) for row in BalanceDailyRollup.query.all()}
+
+        app.test_cli_runner().invoke(args=["rebuild-balance-rollup"])
+        rebuilt = {row.day: (row.total, row.entries) for row in BalanceDailyRollup.query.populate_existing().all()}
+
+    assert UserBalance.query.count() == 1
+    assert current.balance == 40
+    assert {day: value for day, value in incremental.items() if value[1]} == rebuilt
+
+
 def test_remove_book_failed(client_app: FlaskClient) -> None:
     with client_app as test_client:
         response = test_client.delete("/books/10000000/delete")
@@ -142,3 +170,126 @@ def test_get_single_book_failed(client_app: FlaskClient) -> None:
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json == dict(details="Book not Found")
+
+
+def test_get_all_books_paginated(client_app: FlaskClient, fake_available_book: Book,
+                                 fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        first_page = test_client.get("/books?limit=1")
+        second_page = test_client.get(first_page.json["next"])
+
+    assert first_page.status_code == HTTPStatus.OK
+    assert [book["id"] for book in first_page.json["books"]] == [fake_available_book.id]
+    assert second_page.status_code == HTTPStatus.OK
+    assert [book["id"] for book in second_page.json["books"]] == [fake_unavailable_book.id]
+    assert second_page.json["next"] is None
+
+
+def test_get_all_books_invalid_cursor(client_app: FlaskClient) -> None:
+    with client_app as test_client:
+        response = test_client.get("/books?after=not-a-cursor")
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_get_all_books_sparse_fieldset(client_app: FlaskClient, fake_available_book: Book,
+                                       fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        first_page = test_client.get("/books?limit=1&fields=title,status")
+        second_page = test_client.get(first_page.json["next"])
+
+    assert first_page.status_code == HTTPStatus.OK
+    assert first_page.json["books"] == [dict(title=fake_available_book.title, status="not-rented")]
+    assert second_page.json["books"] == [dict(title=fake_unavailable_book.title, status="rented")]
+
+
+def test_get_all_books_unknown_field(client_app: FlaskClient) -> None:
+    with client_app as test_client:
+        response = test_client.get("/books?fields=title,borrower")
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_export_books_ndjson(client_app: FlaskClient, fake_available_book: Book, fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        response = test_client.get("/books", headers={"Accept": "application/x-ndjson"})
+        lines = response.get_data(as_text=True).splitlines()
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line)["id"] for line in lines] == [fake_available_book.id, fake_unavailable_book.id]
+
+
+def test_bulk_import_books(client_app: FlaskClient, fake_available_book: Book) -> None:
+    catalog = "\n".join([
+        "title,author,isbn,date_of_publication,rent_fee,late_penalty_fee",
+        f"Introduction to Algorithms 4th Ed.,Cormen,{fake_available_book.isbn},2022-04-05,150,30",
+        "The Pragmatic Programmer,David Thomas,9780135957059,2019-09-13,,",
+        "Refactoring,Martin Fowler,9780134757599,not-a-date,100,25",
+    ])
+
+    with client_app as test_client:
+        fake_available_book.save()
+
+        response = test_client.post("/books/import", data=catalog, content_type="text/csv")
+
+    db.session.expire_all()
+    imported = Book.query.filter(Book.isbn == "9780135957059").first()
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["inserted"] == 1
+    assert response.json["updated"] == 1
+    assert response.json["rejected"] == 1
+    assert response.json["errors"][0]["line"] == 4
+    assert fake_available_book.title == "Introduction to Algorithms 4th Ed."
+    assert imported.rent_fee == 100
+
+
+def test_bulk_import_books_unsupported_format(client_app: FlaskClient) -> None:
+    with client_app as test_client:
+        response = test_client.post("/books/import", data="<books/>", content_type="application/xml")
+
+    assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+
+def test_get_single_book_not_modified(client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+
+        response = test_client.get(f"/books/{fake_available_book.id}")
+        revalidated = test_client.get(f"/books/{fake_available_book.id}", headers={"If-None-Match": response.headers["ETag"]})
+
+    assert response.status_code == HTTPStatus.OK
+    assert revalidated.status_code == HTTPStatus.NOT_MODIFIED
+    assert revalidated.headers["ETag"] == response.headers["ETag"]
+    assert revalidated.get_data() == b""
+
+
+def test_get_all_books_etag_changes_on_write(client_app: FlaskClient, fake_available_book: Book,
+                                            fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+
+        response = test_client.get("/books")
+        fake_unavailable_book.save()
+        revalidated = test_client.get("/books", headers={"If-None-Match": response.headers["ETag"]})
+        test_client.delete(f"/books/{fake_available_book.id}/delete")
+        test_client.delete(f"/books/{fake_unavailable_book.id}/delete")
+        emptied = test_client.get("/books", headers={"If-None-Match": revalidated.headers["ETag"]})
+
+    assert response.status_code == HTTPStatus.OK
+    assert revalidated.status_code == HTTPStatus.OK
+    assert revalidated.headers["ETag"] != response.headers["ETag"]
+    assert len(revalidated.json["books"]) == 2
+    # An empty collection is a 404, never a 304 of the copy from before the deletes
+    assert emptied.status_code == HTTPStatus.NOT_FOUND
+    assert "ETag" not in emptied.headers
@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import pendulum
+from flask.testing import FlaskClient
+
+from ..nuruja import db
+from ..nuruja.models import Book, Transactions, User, UserCurrentBalance
+
+CLIENTS = 50
+
+
+def make_members(count: int) -> list[User]:
+    members = [
+        User(username=f"member{i}", email=f"member{i}@email.com", phone_number=f"0700{i:06d}", address="earth")
+        for i in range(count)
+    ]
+    db.session.add_all(members)
+    db.session.commit()
+
+    return members
+
+
+def make_books(count: int) -> list[Book]:
+    books = [
+        Book(title=f"Book {i}", author="Author", isbn=f"isbn-{i}", date_of_publication=pendulum.now(), rent_fee=100,
+             late_penalty_fee=25, status="not-rented")
+        for i in range(count)
+    ]
+    db.session.add_all(books)
+    db.session.commit()
+
+    return books
+
+
+def post_concurrently(client_app: FlaskClient, requests: list[tuple[str, dict]]) -> list[int]:
+    """Fires all requests at once, each from its own thread, app context and database session."""
+    app = client_app.application
+    barrier = threading.Barrier(len(requests))
+
+    def post(request: tuple[str, dict]) -> int:
+        url, body = request
+
+        with app.test_client() as client:
+            barrier.wait()
+            return client.post(url, json=body).status_code
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(post, requests))
+
+
+def test_concurrent_borrows_rent_a_book_once(client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app:
+        fake_available_book.save()
+        members = make_members(CLIENTS)
+
+        statuses = post_concurrently(
+            client_app, [(f"/members/{member.id}/borrow", dict(book_id=fake_available_book.id)) for member in members]
+        )
+
+        borrows = Transactions.query.filter(
+            Transactions.book_id == fake_available_book.id, Transactions.is_return == False
+        ).count()
+
+    assert statuses.count(HTTPStatus.OK) == 1
+    assert set(statuses) <= {HTTPStatus.OK, HTTPStatus.CONFLICT, HTTPStatus.NOT_FOUND}
+    assert borrows == 1
+
+
+def test_concurrent_borrows_respect_balance_cut_off(client_app: FlaskClient, fake_user: User) -> None:
+    with client_app:
+        fake_user.save()
+        books = make_books(10)
+
+        statuses = post_concurrently(
+            client_app, [(f"/members/{fake_user.id}/borrow", dict(book_id=book.id)) for book in books]
+        )
+
+        current_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == fake_user.id).first()
+
+    # Rent fee is 100 and the cut-off is 500, so exactly five borrows fit no matter how they interleave
+    assert statuses.count(HTTPStatus.OK) == 5
+    assert statuses.count(HTTPStatus.NOT_ACCEPTABLE) == 5
+    assert current_balance.balance == 500
@@ -0,0 +1,81 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from ..nuruja.controllers.books import unavailable_books_statement
+from ..nuruja.controllers.transactions import latest_borrow, latest_borrows_of
+from ..nuruja.extensions import db
+from ..nuruja.models import Book, Transactions, UserBalance
+
+
+def indexes_used(plan: dict) -> set[str]:
+    used = {plan["Index Name"]} if "Index Name" in plan else set()
+
+    for child in plan.get("Plans", []):
+        used |= indexes_used(child)
+
+    return used
+
+
+def explain(statement) -> dict:
+    if not isinstance(statement, str):
+        statement = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    return db.session.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()[0]["Plan"]
+
+
+@pytest.fixture()
+def seeded(app: Flask, client_app: FlaskClient) -> FlaskClient:
+    with client_app:
+        result = app.test_cli_runner().invoke(
+            args=["seed", "--books", "20000", "--members", "2000", "--loans", "10", "--until", "2024-01-01"]
+        )
+        assert result.exit_code == 0
+
+        # Fresh statistics, so the planner prices the indexes against the real table sizes
+        db.session.execute(text("ANALYZE"))
+        yield client_app
+
+
+def hot_queries() -> dict:
+    """Each hot query, with the indexes added for it; its plan must use all of them"""
+    loan = Transactions.query.filter(Transactions.is_return == False).first()
+    entry = UserBalance.query.filter(UserBalance.transaction_id.isnot(None)).first()
+
+    return {
+        # Most seeded books are available, and for a page of those the primary key is the better plan; the index
+        # earns its keep on the rarer status
+        "rented books": (
+            Book.query.filter(Book.status == "rented", Book.id > 10).order_by(Book.id).limit(51).statement,
+            {"ix_book_status_id"},
+        ),
+        "unavailable books": (unavailable_books_statement(), {"ix_book_status_id", "ix_transactions_book_history"}),
+        "return lookup": (
+            latest_borrow(loan.book_id, loan.user_id).limit(1).statement, {"ix_transactions_open_borrows"}
+        ),
+        "batch return lookup": (
+            latest_borrows_of([loan.book_id, loan.book_id + 1]).statement, {"ix_transactions_open_borrows"}
+        ),
+        "member ledger": (
+            f"SELECT * FROM user_balance WHERE user_id = {entry.user_id} ORDER BY date_of_entry DESC, id DESC LIMIT 1",
+            {"ix_user_balance_user_entries"},
+        ),
+        "book delete cascade": (
+            f"DELETE FROM user_balance WHERE transaction_id = {entry.transaction_id}",
+            {"ix_user_balance_transaction_id"},
+        ),
+        "ledger delete cascade": (
+            f"DELETE FROM user_current_balance WHERE user_balance_id = {entry.id}",
+            {"ix_user_current_balance_user_balance_id"},
+        ),
+    }
+
+
+def test_hot_queries_use_indexes(seeded: FlaskClient) -> None:
+    for name, (statement, indexes) in hot_queries().items():
+        used = indexes_used(explain(statement))
+        db.session.rollback()
+
+        assert indexes <= used, f"{name} used {sorted(used)}"
@@ -1,3 +1,4 @@
+import json
 from http import HTTPStatus
 
 from flask.testing import FlaskClient
@@ -93,3 +94,59 @@ def test_get_all_members_failed(client_app: FlaskClient) -> None:
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json == dict(details="No Users")
+
+
+def test_get_all_members_paginated(client_app: FlaskClient, fake_user: User, fake_admin_user: User) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_admin_user.save()
+
+        first_page = test_client.get("/members?limit=1")
+        second_page = test_client.get(first_page.json["next"])
+
+    assert [member["id"] for member in first_page.json["members"]] == [fake_user.id]
+    assert [member["id"] for member in second_page.json["members"]] == [fake_admin_user.id]
+    assert second_page.json["next"] is None
+
+
+def test_get_all_members_sparse_fieldset(client_app: FlaskClient, fake_user: User, fake_admin_user: User) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_admin_user.save()
+
+        response = test_client.get("/members?fields=username")
+
+    assert response.json["members"] == [dict(username=fake_user.username), dict(username=fake_admin_user.username)]
+
+
+def test_export_members_ndjson(client_app: FlaskClient, fake_user: User, fake_admin_user: User) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_admin_user.save()
+
+        response = test_client.get("/members?format=ndjson")
+        lines = response.get_data(as_text=True).splitlines()
+
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line)["username"] for line in lines] == [fake_user.username, fake_admin_user.username]
+
+
+def test_bulk_import_members(client_app: FlaskClient, fake_user: User) -> None:
+    new_members = "\n".join(json.dumps(member) for member in [
+        dict(username="reader", email="reader@email.com", phone_number="111", address="earth"),
+        dict(username="writer", email=fake_user.email, phone_number="222", address="earth"),
+        dict(username="editor", email="editor@email.com", phone_number="111", address="earth"),
+        dict(username="critic", email="critic@email.com", address="earth"),
+    ])
+
+    with client_app as test_client:
+        fake_user.save()
+
+        response = test_client.post("/members/import", data=new_members, content_type="application/x-ndjson")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["inserted"] == 1
+    assert response.json["rejected"] == 3
+    assert [error["line"] for error in response.json["errors"]] == [2, 3, 4]
+    assert response.json["errors"][0]["reason"] == "email already taken"
+    assert User.query.filter(User.username == "reader").count() == 1
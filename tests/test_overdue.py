@@ -0,0 +1,54 @@
+import pendulum
+from flask import Flask
+from flask.testing import FlaskClient
+
+from ..nuruja.controllers.schemas import BorrowBookSchema
+from ..nuruja.extensions import db
+from ..nuruja.models import BalanceDailyRollup, Book, Transactions, User, UserBalance, UserCurrentBalance
+
+
+def overdue_borrow(test_client: FlaskClient, user: User, book: Book) -> Transactions:
+    test_client.post(f"/members/{user.id}/borrow", json=BorrowBookSchema(book_id=book.id).dict())
+
+    loan = Transactions.query.filter(Transactions.book_id == book.id).one()
+    loan.update(date_due=pendulum.now().subtract(days=2))
+
+    return loan
+
+
+def current_balance(user: User) -> float:
+    db.session.expire_all()
+    return UserCurrentBalance.query.filter(UserCurrentBalance.user_id == user.id).one().balance
+
+
+def test_sweep_charges_overdue_loans_once(app: Flask, client_app: FlaskClient, fake_user: User,
+                                          fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+        loan = overdue_borrow(test_client, fake_user, fake_available_book)
+
+        first = app.test_cli_runner().invoke(args=["sweep-overdue"])
+        second = app.test_cli_runner().invoke(args=["sweep-overdue"])
+
+        assert first.exit_code == second.exit_code == 0
+        assert "1 loans" in first.output
+        assert "0 loans" in second.output
+        assert current_balance(fake_user) == fake_available_book.rent_fee + fake_available_book.late_penalty_fee
+        assert Transactions.query.get(loan.id).penalty_applied
+        assert BalanceDailyRollup.query.get(pendulum.now().date()).entries == UserBalance.query.count()
+
+
+def test_return_after_sweep_skips_the_penalty(app: Flask, client_app: FlaskClient, fake_user: User,
+                                              fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+        overdue_borrow(test_client, fake_user, fake_available_book)
+
+        app.test_cli_runner().invoke(args=["sweep-overdue"])
+        response = test_client.post(f"/members/{fake_user.id}/return",
+                                    json=BorrowBookSchema(book_id=fake_available_book.id).dict())
+
+        assert response.json["details"] == "Late return noted. Late fee already charged"
+        assert current_balance(fake_user) == fake_available_book.late_penalty_fee
@@ -0,0 +1,44 @@
+import os
+import runpy
+
+import pytest
+
+from configs import configs
+
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+@pytest.fixture()
+def server_configs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(configs, "POOL_SIZE", None)
+    monkeypatch.setattr(configs, "WEB_WORKERS", 4)
+    monkeypatch.setattr(configs, "WEB_THREADS", 8)
+    monkeypatch.setattr(configs, "WEB_CONNECTIONS", 200)
+    monkeypatch.setattr(configs, "DATABASE_CONNECTIONS", 80)
+
+
+@pytest.mark.parametrize("profile, threads, pool_size, preload", [
+    ("sync", 1, 1, True),
+    ("gthread", 8, 8, True),
+    ("gevent", 1, 20, False),
+])
+def test_profile_sizes_the_pool_to_its_requests(monkeypatch: pytest.MonkeyPatch, server_configs, profile: str,
+                                                threads: int, pool_size: int, preload: bool) -> None:
+    monkeypatch.setattr(configs, "WEB_PROFILE", profile)
+
+    settings = runpy.run_path(GUNICORN_CONF)
+
+    assert settings["worker_class"] == profile
+    assert settings["workers"] == 4
+    assert settings["threads"] == threads
+    assert settings["preload_app"] is preload
+    assert configs.POOL_SIZE == pool_size
+
+
+def test_profile_keeps_a_set_pool_size(monkeypatch: pytest.MonkeyPatch, server_configs) -> None:
+    monkeypatch.setattr(configs, "WEB_PROFILE", "gthread")
+    monkeypatch.setattr(configs, "POOL_SIZE", 3)
+
+    runpy.run_path(GUNICORN_CONF)
+
+    assert configs.POOL_SIZE == 3
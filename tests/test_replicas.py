@@ -0,0 +1,80 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import event
+from sqlalchemy_utils import drop_database
+
+from configs import configs
+from ..nuruja import create_app, db
+from ..nuruja.extensions import cache
+from ..nuruja.models import Book
+from ..nuruja.routing import PIN_COOKIE
+
+# Stands in for a replica that is down
+UNREACHABLE_DSN = "postgresql://nuruja@127.0.0.1:1/nuruja"
+
+
+@pytest.fixture()
+def replicated_app(monkeypatch: pytest.MonkeyPatch, create_test_database) -> Flask:
+    # The test database doubles as a replica: it is not in recovery, so it never lags
+    monkeypatch.setattr(configs, "REPLICA_DSNS", [str(configs.POSTGRES_DSN), UNREACHABLE_DSN])
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        app.extensions["replicas"].dispose()
+        drop_database(configs.POSTGRES_DSN)
+
+
+def statements_on(engine) -> list[str]:
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    return statements
+
+
+def test_reads_go_to_a_healthy_replica(replicated_app: Flask, fake_available_book: Book) -> None:
+    fake_available_book.save()
+    replica, unreachable = replicated_app.extensions["replicas"].replicas
+    on_replica = statements_on(replica.engine)
+
+    with replicated_app.test_client() as test_client:
+        responses = [test_client.get(f"/books/{fake_available_book.id}") for _ in range(4)]
+
+    assert all(response.json["title"] == fake_available_book.title for response in responses)
+    assert on_replica
+    assert not unreachable.healthy
+
+
+def test_writes_pin_the_client_to_the_primary(replicated_app: Flask, fake_available_book: Book) -> None:
+    replica, _ = replicated_app.extensions["replicas"].replicas
+    on_replica = statements_on(replica.engine)
+    test_client: FlaskClient = replicated_app.test_client()
+
+    response = test_client.post("/books/new",
+                                json=dict(title=fake_available_book.title, author=fake_available_book.author,
+                                          date_of_publication=fake_available_book.date_of_publication,
+                                          status=fake_available_book.status, isbn=fake_available_book.isbn,
+                                          rent_fee=fake_available_book.rent_fee,
+                                          late_penalty_fee=fake_available_book.late_penalty_fee))
+    pinned = test_client.get("/books")
+
+    assert test_client.get_cookie(PIN_COOKIE) is not None
+    assert response.headers["Set-Cookie"].startswith(PIN_COOKIE)
+    assert pinned.json["books"][0]["title"] == fake_available_book.title
+    assert not on_replica
+
+
+def test_cached_responses_are_computed_on_the_primary(replicated_app: Flask, fake_available_book: Book) -> None:
+    fake_available_book.save()
+    cache.clear()
+    replica, _ = replicated_app.extensions["replicas"].replicas
+    on_replica = statements_on(replica.engine)
+
+    with replicated_app.test_client() as test_client:
+        response = test_client.get("/analytics/book-status")
+
+    assert response.headers["X-Cache"] == "MISS"
+    assert not on_replica
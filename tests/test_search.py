@@ -0,0 +1,56 @@
+from http import HTTPStatus
+
+from flask.testing import FlaskClient
+
+from ..nuruja.models import Book
+
+
+def test_search_by_title(client_app: FlaskClient, fake_available_book: Book, fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        response = test_client.post("/filter", json=dict(parameters="algorithms"))
+
+    assert response.status_code == HTTPStatus.OK
+    assert [book["id"] for book in response.json["books"]] == [fake_available_book.id]
+
+
+def test_search_partial_word(client_app: FlaskClient, fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_unavailable_book.save()
+
+        response = test_client.post("/filter", json=dict(parameters="Myth"))
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["books"][0]["id"] == fake_unavailable_book.id
+
+
+def test_search_by_isbn(client_app: FlaskClient, fake_available_book: Book, fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        response = test_client.post("/filter", json=dict(parameters="978-0201006506"))
+
+    assert response.status_code == HTTPStatus.OK
+    assert [book["id"] for book in response.json["books"]] == [fake_unavailable_book.id]
+
+
+def test_search_by_isbn_pages(client_app: FlaskClient, fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_unavailable_book.save()
+
+        response = test_client.post("/filter", json=dict(parameters="978-0201006506", offset=1))
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_search_not_found(client_app: FlaskClient, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_available_book.save()
+
+        response = test_client.post("/filter", json=dict(parameters="cookbook"))
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json == dict(details="Not Found")
@@ -0,0 +1,53 @@
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import func, text
+
+from ..nuruja.extensions import db
+from ..nuruja.models import (BalanceDailyRollup, Book, BookStatusCount, Transactions, User, UserBalance,
+                             UserCurrentBalance)
+
+SEED = ["seed", "--books", "40", "--members", "10", "--loans", "5", "--until", "2024-01-01", "--processes", "2"]
+
+
+def snapshot() -> dict:
+    return dict(
+        books=[(book.isbn, book.status, book.rent_fee) for book in Book.query.order_by(Book.id)],
+        members=[member.username for member in User.query.order_by(User.id)],
+        transactions=[(row.book_id, row.user_id, row.date_borrowed)
+                      for row in Transactions.query.order_by(Transactions.id)],
+        balances=[(row.user_id, row.balance) for row in UserBalance.query.order_by(UserBalance.id)],
+    )
+
+
+def test_seed_is_deterministic(app: Flask, client_app: FlaskClient) -> None:
+    with client_app:
+        first = app.test_cli_runner().invoke(args=[*SEED, "--seed", "3"])
+        seeded = snapshot()
+        db.session.execute(text('TRUNCATE book, "user", transactions, user_balance CASCADE'))
+        db.session.commit()
+        again = app.test_cli_runner().invoke(args=[*SEED, "--seed", "3", "--processes", "1"])
+
+        assert first.exit_code == again.exit_code == 0
+        assert snapshot() == seeded
+        assert len(seeded["books"]) == 40
+        assert len(seeded["members"]) == 10
+        assert seeded["transactions"]
+
+
+def test_seed_keeps_derived_tables_consistent(app: Flask, client_app: FlaskClient) -> None:
+    with client_app:
+        result = app.test_cli_runner().invoke(args=SEED)
+
+        rented = Book.query.filter(Book.status == "rented").count()
+        open_loans = Transactions.query.filter(Transactions.is_return.is_(False)).count() - \
+            Transactions.query.filter(Transactions.is_return.is_(True)).count()
+        counts = {row.status: row.books for row in BookStatusCount.query.all()}
+        current = UserCurrentBalance.query.count()
+        rollup = db.session.query(func.sum(BalanceDailyRollup.entries)).scalar()
+
+        assert result.exit_code == 0
+        assert rented == open_loans == counts.get("rented", 0)
+        assert sum(counts.values()) == 40
+        assert current == db.session.query(func.count(func.distinct(UserBalance.user_id))).scalar()
+        assert rollup == UserBalance.query.count()
+        assert UserBalance.query.filter(UserBalance.balance > 500).count() == 0
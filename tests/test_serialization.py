@@ -0,0 +1,64 @@
+from collections import namedtuple
+from datetime import datetime
+
+import orjson
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from ..nuruja.controllers.schemas import UserBalance, UserBalances
+from ..nuruja.serialization import OrjsonProvider, row_serializer, serialize_rows
+
+# Stands in for a result row of current_balances_statement()
+BalanceRow = namedtuple("BalanceRow", ["id", "user_id", "username", "balance", "date_of_entry"])
+
+
+def test_orjson_provider_matches_flask_output() -> None:
+    app = Flask(__name__)
+    body = dict(details="Late return noted", balance=150, when=datetime(2023, 3, 6, 9, 30), items=[1.5, None])
+
+    assert OrjsonProvider(app).response(body).get_data() == DefaultJSONProvider(app).response(body).get_data()
+
+
+def test_orjson_provider_writes_non_ascii_as_utf8() -> None:
+    app = Flask(__name__)
+    body = dict(title="Cien años de soledad", author="Gabriel García Márquez")
+
+    fast = OrjsonProvider(app).response(body).get_data()
+    default = DefaultJSONProvider(app).response(body).get_data()
+
+    assert "años".encode() in fast
+    assert b"a\\u00f1os" in default
+    assert orjson.loads(fast) == orjson.loads(default)
+
+
+def test_orjson_provider_leaves_other_arguments_to_flask() -> None:
+    app = Flask(__name__)
+    body = dict(title="Cien años de soledad", pages=417)
+
+    for kwargs in (dict(separators=(", ", ": ")), dict(ensure_ascii=True), dict(sort_keys=False), dict(indent=4)):
+        assert OrjsonProvider(app).dumps(body, **kwargs) == DefaultJSONProvider(app).dumps(body, **kwargs)
+
+
+def test_serialize_rows_matches_schema() -> None:
+    app = Flask(__name__)
+    rows = [BalanceRow(7, 3, "tester", 150.7, datetime(2023, 3, 6, 9, 30)),
+            BalanceRow(8, 4, "other", 0.0, datetime(2023, 3, 7))]
+
+    fast = dict(balances=serialize_rows(UserBalance, rows))
+    pydantic = UserBalances(balances=rows).dict()
+
+    assert fast == pydantic
+    assert OrjsonProvider(app).response(fast).get_data() == DefaultJSONProvider(app).response(pydantic).get_data()
+
+
+def test_row_serializer_shares_one_plan_per_fieldset() -> None:
+    fields = ("id", "username", "balance")
+
+    serialize = row_serializer(UserBalance, fields, ("balance", "id"))
+
+    assert serialize is row_serializer(UserBalance, fields, ("id", "balance"))
+    assert serialize((7, "tester", 150.7)) == dict(id=7, balance=150)
+
+    with pytest.raises(ValueError):
+        row_serializer(UserBalance, fields, ("id", "password"))
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from configs import ENVIRONMENTS, LazyConfigs
+from ..benchmarks.startup import import_times
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Needed by a command or two, or only once the application is created; importing nuruja must not load them
+DEFERRED = {"faker", "sqlalchemy_utils", "flask_pydantic", "pytz", "nuruja.synthetic", "nuruja.controllers.books",
+            "nuruja.controllers.transactions", "nuruja.bulk", "nuruja.overdue"}
+
+
+def test_package_import_defers_heavy_modules(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(ROOT)
+
+    assert not DEFERRED & set(import_times("import nuruja"))
+
+
+def test_configs_are_not_read_on_import() -> None:
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import configs, sys; sys.exit(configs.configs._configs is not None)"],
+        cwd=ROOT,
+    )
+
+    assert loaded.returncode == 0
+
+
+def test_package_import_does_not_read_configs() -> None:
+    # Without any settings, reading them would fail validation
+    environment = {name: value for name, value in os.environ.items()
+                   if not name.startswith(tuple(settings.__config__.env_prefix for settings in ENVIRONMENTS.values()))}
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import nuruja, configs, sys; sys.exit(configs.configs._configs is not None)"],
+        cwd=ROOT, env=environment,
+    )
+
+    assert loaded.returncode == 0
+
+
+@pytest.mark.parametrize("env", ENVIRONMENTS)
+def test_configs_build_only_the_selected_environment(monkeypatch: pytest.MonkeyPatch, env: str) -> None:
+    monkeypatch.setenv("ENV", env.upper())
+    built = []
+
+    for name, settings in ENVIRONMENTS.items():
+        monkeypatch.setattr(settings, "__init__", lambda self, name=name: built.append(name))
+
+    LazyConfigs()._load()
+
+    assert built == [env]
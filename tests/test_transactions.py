@@ -5,7 +5,7 @@ from flask.testing import FlaskClient
 from sqlalchemy import and_
 
 from ..nuruja.controllers.schemas import BorrowBookSchema
-from ..nuruja.models import User, Book, Transactions, UserBalance
+from ..nuruja.models import User, Book, Transactions, UserBalance, UserCurrentBalance
 
 
 def test_initiate_borrow(client_app: FlaskClient, fake_user: User, fake_available_book: Book) -> None:
@@ -74,3 +74,88 @@ def test_initiate_late_return(client_app: FlaskClient, fake_user: User, fake_una
     assert response.status_code == HTTPStatus.OK
     assert balance == (fake_unavailable_book.rent_fee + fake_unavailable_book.late_penalty_fee)
     assert fake_unavailable_book.status == "not-rented"
+
+
+def test_borrow_updates_current_balance(client_app: FlaskClient, fake_user: User, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+
+        test_client.post(f"/members/{fake_user.id}/borrow",
+                         json=BorrowBookSchema(book_id=fake_available_book.id).dict())
+
+        response = test_client.get("/balances/all")
+
+    current_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == fake_user.id).first()
+    latest_entry = UserBalance.query.filter(UserBalance.user_id == fake_user.id).first()
+
+    assert current_balance.balance == fake_available_book.rent_fee
+    assert current_balance.user_balance_id == latest_entry.id
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["balances"][0]["balance"] == fake_available_book.rent_fee
+
+
+def test_rejected_borrow_writes_nothing(client_app: FlaskClient, fake_user: User, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+
+        UserBalance.create(balance=450, date_of_entry=pendulum.now(), user_id=fake_user.id)
+
+        response = test_client.post(f"/members/{fake_user.id}/borrow",
+                                    json=BorrowBookSchema(book_id=fake_available_book.id).dict())
+
+    assert response.status_code == HTTPStatus.NOT_ACCEPTABLE
+    assert Transactions.query.filter(Transactions.book_id == fake_available_book.id).count() == 0
+    assert fake_available_book.status == "not-rented"
+
+
+def test_batch_borrow(client_app: FlaskClient, fake_user: User, fake_available_book: Book,
+                      fake_unavailable_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+        fake_unavailable_book.save()
+
+        response = test_client.post(f"/members/{fake_user.id}/borrow/batch",
+                                    json=dict(book_ids=[fake_available_book.id, fake_unavailable_book.id]))
+
+    entries = UserBalance.query.filter(UserBalance.user_id == fake_user.id).all()
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["books"] == [dict(book_id=fake_available_book.id, status="borrowed"),
+                                      dict(book_id=fake_unavailable_book.id, status="unavailable")]
+    assert [entry.balance for entry in entries] == [fake_available_book.rent_fee]
+    assert fake_available_book.status == "rented"
+
+
+def test_batch_borrow_above_cut_off(client_app: FlaskClient, fake_user: User, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+
+        UserBalance.create(balance=450, date_of_entry=pendulum.now(), user_id=fake_user.id)
+
+        response = test_client.post(f"/members/{fake_user.id}/borrow/batch",
+                                    json=dict(book_ids=[fake_available_book.id]))
+
+    assert response.status_code == HTTPStatus.NOT_ACCEPTABLE
+    assert fake_available_book.status == "not-rented"
+
+
+def test_batch_return(client_app: FlaskClient, fake_user: User, fake_available_book: Book) -> None:
+    with client_app as test_client:
+        fake_user.save()
+        fake_available_book.save()
+
+        test_client.post(f"/members/{fake_user.id}/borrow/batch", json=dict(book_ids=[fake_available_book.id]))
+        response = test_client.post(f"/members/{fake_user.id}/return/batch",
+                                    json=dict(book_ids=[fake_available_book.id, 10000000]))
+
+    current_balance = UserCurrentBalance.query.filter(UserCurrentBalance.user_id == fake_user.id).first()
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["books"] == [dict(book_id=fake_available_book.id, status="returned"),
+                                      dict(book_id=10000000, status="not-rented-out")]
+    assert current_balance.balance == 0
+    assert fake_available_book.status == "not-rented"